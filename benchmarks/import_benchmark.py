@@ -0,0 +1,54 @@
+"""
+Start-up cost of the main entry points: wall time of a fresh interpreter importing each module, whether
+the heavy optional modules (openai, cv2) were pulled in, and the cost of the first data access, which is
+when the dataset is now loaded.
+
+Each measurement runs in a new process, so nothing is cached between runs except the OS page cache.
+
+Usage (from the repository root):
+    python -m benchmarks.import_benchmark --repeats 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+targets = ["model.llm", "model.task", "utils.code_utils", "run"]
+
+probe = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter() - start
+result = {{"import": imported, "heavy": sorted(m for m in ("openai", "cv2") if m in sys.modules)}}
+if {access}:
+    import utils.code_utils as code_utils
+    start = time.perf_counter()
+    code_utils.data['rates']
+    result["first_access"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+def measure(module, access, repeats):
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", probe.format(module=module, access=access)],
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return runs
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in targets:
+        runs = measure(module, False, args.repeats)
+        print(f"import {module:18s} median {statistics.median(r['import'] for r in runs) * 1000:7.1f} ms"
+              f"   heavy modules loaded: {', '.join(runs[0]['heavy']) or 'none'}")
+    runs = measure("utils.code_utils", True, args.repeats)
+    print(f"first data['rates'] access   median {statistics.median(r['first_access'] for r in runs) * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions server (e.g. Ollama), for benchmarking the
+agent without a model.
+
+Responses are synthesized from the prompt: action selections (**N**), JSON subtask and idea lists,
+Python code blocks and summaries, each wrapped in a <think> block of configurable length. A configurable
+fraction of responses is malformed or contains failing code, to exercise the retry and debug paths.
+Latency is drawn from a lognormal distribution and, for streamed requests, spread over the chunks.
+
+Usage:
+    python -m benchmarks.mock_server --port 11435
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# subtasks the divide action tends to propose again and again
+stock_subtasks = [{"summary": "Filter neurons by quality", "description": "Select the neurons whose mean firing rate exceeds 1 Hz and whose explainable variance exceeds 0.4."},
+                  {"summary": "Compute direction tuning", "description": "Estimate the preferred motion direction of each good neuron from the optical flow of the videos."},
+                  {"summary": "Relate tuning to depth", "description": "Test whether the preferred direction of the good neurons changes with their depth along the probe."}]
+
+class MockConfig:
+    def __init__(self, width=3, p_divide=0.5, p_malformed=0.1, p_code_error=0.2, latency_mean=0.2,
+                 latency_sigma=0.5, think_words=50, p_duplicate=0.0, seed=0):
+        self.width = width                  # subtasks per divide response
+        self.p_divide = p_divide            # probability of selecting divide when it is offered
+        self.p_malformed = p_malformed      # probability a response cannot be parsed
+        self.p_code_error = p_code_error    # probability generated code raises
+        self.latency_mean = latency_mean    # median response latency in seconds
+        self.latency_sigma = latency_sigma  # lognormal sigma of the latency
+        self.think_words = think_words      # length of the <think> block
+        self.p_duplicate = p_duplicate      # probability a subtask is one of a few stock tasks, giving near-duplicates
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def sample(self, p):
+        with self.lock:
+            return self.random.random() < p
+
+    def latency(self):
+        with self.lock:
+            return self.latency_mean * self.random.lognormvariate(0, self.latency_sigma) if self.latency_mean > 0 else 0.0
+
+def classify(prompt):
+    if "identify the best action" in prompt:
+        return "select"
+    if "break down the following task" in prompt:
+        return "divide"
+    if "brainstorm ideas" in prompt:
+        return "brainstorm"
+    if "write Python code" in prompt or "returned this error" in prompt:
+        return "code"
+    if "install the appropriate module" in prompt:
+        return "install"
+    if "summarize" in prompt.lower():
+        return "summarize"
+    return "other"
+
+def respond(config, prompt):
+    kind = classify(prompt)
+    malformed = kind in ("select", "divide", "brainstorm", "code") and config.sample(config.p_malformed)
+    with config.lock:
+        config.counts[kind] += 1
+        config.counts["malformed"] += malformed
+        n = config.counts[kind]
+
+    if malformed:
+        body = "I am not sure how to format this answer."
+    elif kind == "select":
+        options = [(int(number), name) for number, name in re.findall(r"^\s*(\d+)\. ([^:\n]+):", prompt, re.MULTILINE)]
+        divide = [number for number, name in options if "Divide" in name]
+        others = [number for number, name in options if "Divide" not in name] or [1]
+        choice = divide[0] if divide and config.sample(config.p_divide) else config.random.choice(others)
+        body = f"**{choice}** This action makes the most progress on the task."
+    elif kind == "divide":
+        subtasks = [config.random.choice(stock_subtasks) if config.sample(config.p_duplicate) else
+                    {"summary": f"Mock subtask {n}.{i}", "description": f"Analyze aspect {i} of the data for mock subtask {n}.{i}."}
+                    for i in range(config.width)]
+        body = "```json\n" + json.dumps(subtasks, indent=4) + "\n```"
+    elif kind == "brainstorm":
+        body = "```json\n" + json.dumps([f"Idea {n}.{i}: neurons at different depths respond differently to motion. This is testable." for i in range(3)]) + "\n```"
+    elif kind == "code":
+        error = "1 / 0\n" if config.sample(config.p_code_error) else ""
+        body = ("```python\nimport math\n\ndef mock_analysis_%d(x):\n    \"\"\"\n    Mock analysis.\n    Input: x (float)\n    Output: float\n    \"\"\"\n"
+                "    return math.sqrt(x)\n\n%smock_result = mock_analysis_%d(2.0)\n```") % (n, error, n)
+    elif kind == "install":
+        body = "```python\nimport sys\n```"
+    else:
+        body = "I analyzed the task and saved the results to ./outputs/. The functions I wrote are documented above."
+    return kind, "<think>" + " ".join(["hmm"] * config.think_words) + "</think>" + body
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, obj):
+            data = json.dumps(obj).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                with config.lock:
+                    self.send_json(dict(config.counts))
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = request["messages"][-1]["content"]
+            prompt = prompt if isinstance(prompt, str) else " ".join(part.get("text", "") for part in prompt)
+            kind, content = respond(config, prompt)
+            if request.get("max_tokens") == 1:
+                content = content[:1]
+            latency = config.latency()
+            prompt_tokens = sum(len(str(m["content"])) for m in request["messages"]) // 4
+            completion_tokens = len(content) // 4
+
+            if not request.get("stream"):
+                time.sleep(latency)
+                self.send_json({"id": "mock", "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+                                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                          "total_tokens": prompt_tokens + completion_tokens}})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            pieces = re.findall(r"\S+\s*|\s+", content)
+            try:
+                for piece in pieces:
+                    time.sleep(latency / len(pieces))
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": request["model"],
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                with config.lock:
+                    config.counts["cancelled_streams"] += 1
+            self.close_connection = True
+
+    return Handler
+
+def start_server(config, host="127.0.0.1", port=0):
+    """
+    Start the mock server in a background thread. Returns (server, base_url).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--width", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--p-malformed", type=float, default=0.1)
+    args = parser.parse_args()
+    server, base_url = start_server(MockConfig(width=args.width, latency_mean=args.latency, p_malformed=args.p_malformed), port=args.port)
+    print(f"mock server listening on {base_url}")
+    threading.Event().wait()
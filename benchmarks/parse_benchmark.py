@@ -0,0 +1,109 @@
+"""
+Micro-benchmark of response parsing on large model outputs: the previous parsers (one regex compile and
+search per call, one ast.parse per parser, source re-split for every function) against the single-pass
+analysis in utils.response_utils.
+
+Each round does what a node does with one code response: strip the <think> block, extract the code,
+then get the function comments, the function sources and the normalized hashes for the registry.
+
+Usage (from the repository root, no model server needed):
+    python -m benchmarks.parse_benchmark --functions 40 --think-words 4000 --rounds 50
+"""
+import argparse
+import ast
+import re
+import statistics
+import textwrap
+import time
+
+from utils.response_utils import analyze_code, analyze_response, normalized_hash, split_docstring
+
+def make_response(n_functions, think_words, body_lines):
+    functions = []
+    for i in range(n_functions):
+        body = "\n".join(f"    x{j} = np.mean(data['rates'][{j}:{j} + 10], axis=0)" for j in range(body_lines))
+        functions.append(f'def analysis_{i}(data, window=10):\n    """\n    Analysis number {i}.\n'
+                         f'    Input: data (dict), window (int)\n    Output: float\n    """\n{body}\n    return x0\n')
+    code = "import numpy as np\n\n" + "\n\n".join(functions) + '\nif __name__ == "__main__":\n    analysis_0(data)\n'
+    return "<think>" + " ".join(["hmm"] * think_words) + "</think>Here is the code:\n```python\n" + code + "```\n"
+
+# the parsers as they were before utils.response_utils
+def legacy_remove_main_guard(code):
+    pattern = r'if __name__ == "__main__":\n(.*)'
+    match = re.search(pattern, code, re.DOTALL)
+    if match:
+        code = re.sub(pattern, textwrap.dedent(match.group(1)), code, flags=re.DOTALL)
+    return code.strip()
+
+def legacy_parse_action_code(text):
+    section = re.search(r"```(.*?)```", text, re.DOTALL).group(1) if re.search(r"```(.*?)```", text, re.DOTALL) else None
+    output = '\n'.join(lines[1:]) if (lines := section.splitlines())[0].find('import') == -1 else section
+    return legacy_remove_main_guard(output)
+
+def legacy_parse_comments(code):
+    functions = []
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.FunctionDef):
+            docstring = ast.get_docstring(node)
+            entry = {"name": node.name, "docstring": docstring}
+            entry.update(split_docstring(docstring) if docstring else {})
+            functions.append(entry)
+    return functions
+
+def legacy_parse_functions(code):
+    functions = {}
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.FunctionDef):
+            end = max(n.lineno for n in ast.walk(node) if hasattr(n, 'lineno'))
+            functions[node.name] = '\n'.join(code.split('\n')[node.lineno - 1:end])
+    return functions
+
+def legacy_round(response):
+    text = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
+    code = legacy_parse_action_code(text)
+    legacy_parse_comments(code)
+    sources = legacy_parse_functions(code)
+    [normalized_hash(source) for source in sources.values()]
+
+def analysis_round(response):
+    analysis = analyze_response(response).code_analysis
+    analysis.comments()
+    analysis.function_sources()
+    [function["hash"] for function in analysis.functions]
+
+def time_rounds(fn, responses):
+    times = []
+    for response in responses:
+        start = time.perf_counter()
+        fn(response)
+        times.append(time.perf_counter() - start)
+    return times
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--functions", type=int, default=40)
+    parser.add_argument("--think-words", type=int, default=4000)
+    parser.add_argument("--body-lines", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    # distinct responses, so the analysis cache cannot serve a round from an earlier one
+    base = make_response(args.functions, args.think_words, args.body_lines)
+    responses = [base.replace("window=10", f"window={10 + i}") for i in range(args.rounds)]
+    print(f"response size: {len(base) / 1024:.0f} KiB, {args.functions} functions")
+
+    results = {"legacy": time_rounds(legacy_round, responses),
+               "single-pass": time_rounds(analysis_round, responses)}
+    for name, times in results.items():
+        print(f"{name:12s} median {statistics.median(times) * 1000:8.2f} ms   total {sum(times):.2f}s")
+    print(f"speedup: {statistics.median(results['legacy']) / statistics.median(results['single-pass']):.2f}x")
+
+    # repeated parses of the same block (comments, function log, registry, exec pool) hit the cache
+    code = analyze_response(responses[0]).code
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        analyze_code(code).function_sources()
+    print(f"cached re-analysis: {(time.perf_counter() - start) / args.rounds * 1e6:.1f} us per call")
+
+if __name__ == "__main__":
+    main()
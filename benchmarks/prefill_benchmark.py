@@ -0,0 +1,65 @@
+"""
+Measures prefill latency per node for the legacy prompt layout (task first, dataset and history after)
+and the prefix layout (dataset in a shared system message, shared content first, task last).
+
+Each node sends its action-selection and take-action prompts with max_tokens=1, so the request time is
+almost entirely prompt processing. With the prefix layout every node after the first should hit the
+server's prompt cache for the shared leading block.
+
+Usage (from the repository root, with the model server running):
+    python -m benchmarks.prefill_benchmark --nodes 8 --model deepseek-r1:32b
+"""
+import argparse
+import logging
+import statistics
+import time
+
+from dataset.neuropixel import dataset_details
+from model.llm import configure_clients, get_client
+from model.task import Task
+from prompts.action_prompts import action_dict
+
+def build_nodes(n_nodes, prefix_layout):
+    root = Task(level=0, task_prompt="Your overall goal is to make novel scientific discoveries about a dataset you are provided with.",
+                action_dict=action_dict, comment_list=[], idea_list=[], dataset_info=dataset_details, logging=logging,
+                prefix_layout=prefix_layout)
+    root.spawn_subtasks([f"Subtask {i}. Analyze how property {i} of the neurons relates to the motion content of the videos, "
+                         f"and save a plot and a statistical summary of the result." for i in range(n_nodes)])
+    return root.subtasks
+
+def time_prefill(client, model, messages):
+    start = time.perf_counter()
+    client.chat.completions.create(model=model, messages=messages, max_tokens=1, temperature=0)
+    return time.perf_counter() - start
+
+def run_layout(client, model, n_nodes, prefix_layout):
+    times = []
+    for node in build_nodes(n_nodes, prefix_layout):
+        prompts = [node.selection_prompt()]
+        node.action = "Write code"
+        prompts.append(node.action_prompt())
+        for prompt in prompts:
+            messages = list(node.lm.conversation_history) + [{"role": "user", "content": prompt}]
+            times.append(time_prefill(client, model, messages))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=8)
+    parser.add_argument("--model", default="deepseek-r1:32b")
+    parser.add_argument("--base-url", default=None)
+    args = parser.parse_args()
+    if args.base_url is not None:
+        configure_clients(base_url=args.base_url)
+    client = get_client()
+
+    for name, prefix_layout in [("legacy", False), ("prefix", True)]:
+        # an unrelated request first, so neither layout starts with a warm cache from the other
+        time_prefill(client, args.model, [{"role": "user", "content": "Say hello."}])
+        times = run_layout(client, args.model, args.nodes, prefix_layout)
+        print(f"{name:>7}: {len(times)} requests, mean {statistics.mean(times):.3f}s, "
+              f"median {statistics.median(times):.3f}s, first {times[0]:.3f}s, "
+              f"mean after first {statistics.mean(times[1:]) if len(times) > 1 else float('nan'):.3f}s")
+
+if __name__ == "__main__":
+    main()
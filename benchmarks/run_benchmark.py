@@ -0,0 +1,123 @@
+"""
+End-to-end benchmark of the agent against the local mock server (benchmarks/mock_server.py).
+
+Builds a Task tree with the configured depth and width, takes the usual seed actions and drives the rest
+with process_subtasks or the TreeScheduler, then reports wall time, LLM calls per node, retries, response
+kinds and memory. No model server or GPU is needed, so scheduler, caching and parsing changes can be
+compared under identical, reproducible conditions.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmark --depth 2 --width 3 --latency 0.2 --workers 4
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+from benchmarks.mock_server import MockConfig, start_server
+from model.llm import configure_clients
+from model.scheduler import TreeScheduler
+from model.explorer import Budget, BestFirstExplorer
+from model.task import Task
+from prompts.action_prompts import action_dict
+from run import process_subtasks
+from utils.similarity_utils import SimilarityIndex
+from utils.results_utils import ResultsStore
+from utils.trace_utils import tracer
+
+def count_nodes(task):
+    return 1 + sum(count_nodes(subtask) for subtask in task.subtasks)
+
+def run_benchmark(depth=2, width=3, latency=0.2, latency_sigma=0.5, p_malformed=0.1, p_code_error=0.2, p_divide=0.5,
+                  workers=1, batch_select=False, stream=False, n_speculative=1, p_duplicate=0.0, dedup_threshold=None, budget=None, seed=0):
+    config = MockConfig(width=width, p_divide=p_divide, p_malformed=p_malformed, p_code_error=p_code_error,
+                        latency_mean=latency, latency_sigma=latency_sigma, p_duplicate=p_duplicate, seed=seed)
+    server, base_url = start_server(config)
+    configure_clients(base_url=base_url, max_retries=0)
+    os.makedirs("./logs", exist_ok=True)
+    if not tracer.enabled:
+        tracer.enable()
+
+    similarity = SimilarityIndex(threshold=dedup_threshold) if dedup_threshold is not None else None
+    results_store = ResultsStore(os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "results.sqlite"))
+    tracemalloc.start()
+    start = time.perf_counter()
+    task = Task(level=0, task_prompt="Your overall goal is to make novel scientific discoveries about a dataset you are provided with.",
+                action_dict=action_dict, comment_list=[], idea_list=[], dataset_info="Mock dataset.", logging=logging,
+                max_depth=depth, stream=stream, n_speculative=n_speculative, similarity=similarity, results_store=results_store)
+    task.action = "Brainstorm"
+    task.take_action()
+    task.action = "Divide task into smaller subtasks"
+    task.take_action()
+    explorer = None
+    if budget is not None:
+        explorer = BestFirstExplorer(budget)
+        explorer.run(task)
+    elif workers > 1:
+        TreeScheduler(max_workers=workers, batch_select=batch_select).run(task)
+    else:
+        process_subtasks(task, batch_select=batch_select)
+    wall_time = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with urllib.request.urlopen(base_url + "/stats") as response:
+        counts = json.loads(response.read())
+    server.shutdown()
+
+    n_nodes = count_nodes(task)
+    n_calls = sum(value for key, value in counts.items() if key not in ("malformed", "cancelled_streams"))
+    retries = sum(1 for record in tracer.spans if record["attrs"].get("retry", 0) > 0)
+    report = {"nodes": n_nodes,
+            "wall_time": wall_time,
+            "llm_calls": n_calls,
+            "calls_per_node": n_calls / n_nodes,
+            "retries": retries,
+            "response_kinds": counts,
+            "peak_python_memory_mb": peak_bytes / 2**20,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "results_saved": results_store.count()}
+    if explorer is not None:
+        report["explorer"] = explorer.report()
+    if similarity is not None:
+        report["dedup"] = similarity.report(cost=Task.subtree_llm_time)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--width", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="median mock response latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--p-malformed", type=float, default=0.1)
+    parser.add_argument("--p-code-error", type=float, default=0.2)
+    parser.add_argument("--p-divide", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-select", action="store_true")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--speculative-fixes", type=int, default=1)
+    parser.add_argument("--p-duplicate", type=float, default=0.0, help="probability a mock subtask repeats a stock task")
+    parser.add_argument("--dedup", nargs="?", type=float, const=0.8, default=None, help="merge/reuse near-duplicate subtasks at this similarity")
+    parser.add_argument("--budget-time", type=float, default=None)
+    parser.add_argument("--budget-calls", type=int, default=None)
+    parser.add_argument("--budget-tokens", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    budget = None
+    if any(limit is not None for limit in (args.budget_time, args.budget_calls, args.budget_tokens)):
+        budget = Budget(wall_time=args.budget_time, llm_calls=args.budget_calls, tokens=args.budget_tokens)
+
+    report = run_benchmark(depth=args.depth, width=args.width, latency=args.latency, latency_sigma=args.latency_sigma,
+                           p_malformed=args.p_malformed, p_code_error=args.p_code_error, p_divide=args.p_divide,
+                           workers=args.workers, batch_select=args.batch_select, stream=args.stream, n_speculative=args.speculative_fixes,
+                           p_duplicate=args.p_duplicate, dedup_threshold=args.dedup, budget=budget, seed=args.seed)
+    print(json.dumps(report, indent=2))
+    print(tracer.summary())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Memory and pickle size of a large synthetic Task tree (10k nodes by default).
+
+The tree is built with spawn_subtasks exactly as a run would build it, without any model calls. With
+--eager-lm every node also creates its LLM, which is what every node used to do in its constructor.
+
+Usage (from the repository root, no model server needed):
+    python -m benchmarks.tree_memory_benchmark --width 100 --depth 2
+    python -m benchmarks.tree_memory_benchmark --width 100 --depth 2 --eager-lm
+"""
+import argparse
+import logging
+import pickle
+import time
+import tracemalloc
+
+from model.task import Task
+from prompts.action_prompts import action_dict
+
+def build_tree(width, depth, eager_lm):
+    root = Task(level=0, task_prompt="Your overall goal is to make novel scientific discoveries about a dataset you are provided with.",
+                action_dict=action_dict, comment_list=[], idea_list=[], dataset_info="Synthetic dataset description. " * 50,
+                logging=logging, max_depth=depth)
+    frontier, n_nodes = [root], 1
+    while frontier:
+        node = frontier.pop()
+        if eager_lm:
+            node.lm
+        if node.level < depth:
+            node.spawn_subtasks([f"Subtask {'.'.join(map(str, node.path + (i,)))}: analyze property {i} of the neurons "
+                                 f"and save a plot and a statistical summary of the result." for i in range(width)])
+            frontier.extend(node.subtasks)
+            n_nodes += width
+    return root, n_nodes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--eager-lm", action="store_true", help="create every node's LLM, as the constructor used to")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    root, n_nodes = build_tree(args.width, args.depth, args.eager_lm)
+    build_time = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    blob = pickle.dumps(root, protocol=pickle.HIGHEST_PROTOCOL)
+    dump_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pickle.loads(blob)
+    load_time = time.perf_counter() - start
+
+    print(f"nodes:        {n_nodes}")
+    print(f"build:        {build_time:.2f}s")
+    print(f"memory:       {current / 2**20:.1f} MiB ({current / n_nodes:.0f} bytes per node), peak {peak / 2**20:.1f} MiB")
+    print(f"pickle:       {len(blob) / 2**20:.2f} MiB ({len(blob) / n_nodes:.0f} bytes per node), "
+          f"dump {dump_time:.2f}s, load {load_time:.2f}s")
+
+if __name__ == "__main__":
+    main()
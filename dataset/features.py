@@ -0,0 +1,121 @@
+import os
+import sys
+import numpy as np
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from dataset.neuropixel import shared_data
+from dataset.video_store import get_video_store
+
+features_path = './dataset/features.npz'
+
+# name -> function taking one video (n_frames, height, width, 3) uint8 and returning a scalar or 1d array
+feature_functions = OrderedDict()
+
+def register_feature(name):
+    """
+    Decorator registering a per-video feature function for compute_features.
+    """
+    def decorator(function):
+        feature_functions[name] = function
+        return function
+    return decorator
+
+def luminance(video):
+    return video.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+@register_feature("mean_luminance")
+def mean_luminance(video):
+    return luminance(video).mean()
+
+@register_feature("rms_contrast")
+def rms_contrast(video):
+    return luminance(video).std()
+
+@register_feature("motion_energy")
+def motion_energy(video):
+    # mean squared luminance change between consecutive frames
+    return np.square(np.diff(luminance(video), axis=0)).mean()
+
+@register_feature("optical_flow")
+def optical_flow(video):
+    # mean Farneback flow (dx, dy) and mean flow speed, averaged over frame pairs
+    import cv2
+    gray = luminance(video).astype(np.uint8)
+    flows = np.stack([cv2.calcOpticalFlowFarneback(gray[i], gray[i + 1], None, 0.5, 3, 15, 3, 5, 1.2, 0)
+                      for i in range(len(gray) - 1)])
+    return np.array([flows[..., 0].mean(), flows[..., 1].mean(), np.linalg.norm(flows, axis=-1).mean()])
+
+def _extract(video_ids, functions):
+    # returns, per video, a list with one 1d array per feature
+    store = get_video_store()
+    return [[np.atleast_1d(np.asarray(function(store.get(video_id)), dtype=np.float64)) for function in functions]
+            for video_id in video_ids]
+
+def _importable(function):
+    # whether a process started by the forkserver can unpickle function (by reference to its module)
+    module = sys.modules.get(function.__module__)
+    return function.__module__ != "__main__" and getattr(module, function.__qualname__, None) is function
+
+def compute_features(video_ids=None, names=None, n_processes=None, chunksize=32, cache_path=features_path):
+    """
+    Decode the stimuli in a process pool, apply the registered feature functions to each video and
+    save the (n_videos x n_columns) feature matrix to cache_path. The pool starts its processes from the
+    forkserver, as utils.exec_pool does, since forking this (multithreaded) process could deadlock. A
+    thread pool is used instead in daemonic processes (such as the exec pool workers), which cannot start
+    a process pool, and for features registered at runtime (e.g. by generated code), which the pool's
+    processes could not import.
+
+    Returns (ids, features, columns) where ids are the video ids of the rows and columns names every
+    feature column (name_i for features returning more than one value).
+    """
+    if video_ids is None:
+        video_ids = np.unique(np.asarray(shared_data['videos']).astype(str))
+    video_ids = sorted(str(video_id) for video_id in video_ids)
+    names = list(feature_functions) if names is None else list(names)
+
+    chunks = [video_ids[i:i + chunksize] for i in range(0, len(video_ids), chunksize)]
+    functions = [feature_functions[name] for name in names]
+    if multiprocessing.current_process().daemon or not all(_importable(function) for function in functions):
+        executor = ThreadPoolExecutor(max_workers=n_processes or os.cpu_count())
+    else:
+        executor = ProcessPoolExecutor(max_workers=n_processes or os.cpu_count(), mp_context=multiprocessing.get_context("forkserver"))
+    with executor:
+        rows = [row for chunk in executor.map(_extract, chunks, [functions] * len(chunks)) for row in chunk]
+
+    features = np.array([np.concatenate(row) for row in rows])
+    sizes = [value.size for value in rows[0]]
+    columns = [name if size == 1 else f"{name}_{i}" for name, size in zip(names, sizes) for i in range(size)]
+
+    if cache_path is not None:
+        np.savez(cache_path, ids=np.array(video_ids), features=features, columns=np.array(columns), names=np.array(names))
+    return np.array(video_ids), features, columns
+
+def load_features(trial_videos=None, names=None, cache_path=features_path):
+    """
+    Return (features, columns) with one row per trial, aligned with trial_videos (default data['videos']).
+    The cached feature file is reused when it has the requested features, otherwise it is recomputed.
+    """
+    if trial_videos is None:
+        trial_videos = shared_data['videos']
+    trial_videos = np.asarray(trial_videos).astype(str)
+    names = list(feature_functions) if names is None else list(names)
+
+    cached = None
+    if cache_path is not None and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if list(cached['names']) != names or not np.isin(trial_videos, cached['ids']).all():
+            cached = None
+    if cached is None:
+        ids, features, columns = compute_features(np.unique(trial_videos), names=names, cache_path=cache_path)
+    else:
+        ids, features, columns = cached['ids'], cached['features'], list(cached['columns'])
+
+    return features[np.searchsorted(ids, trial_videos)], columns
+
+if __name__ == "__main__":
+    # through the importable module, so the pool's processes can unpickle its feature functions
+    from dataset.features import compute_features
+    ids, features, columns = compute_features()
+    print(f"computed {features.shape[1]} feature columns for {len(ids)} videos: {columns}")
@@ -0,0 +1,104 @@
+import os
+import threading
+import numpy as np
+
+from dataset.neuropixel import shared_data
+
+index_path = './dataset/data_index.npz'
+
+class DataIndex:
+    """
+    Precomputed lookups over the data dictionary that nearly every analysis needs.
+
+    Attributes:
+        mean_rates (n_neurons,): mean firing rate of each neuron over all trials (spikes/sec).
+        expvar (n_neurons,): explainable variance of each neuron.
+        train_trials, test_trials: indices of the train (split True) and test (split False) trials.
+        video_ids (n_videos,): sorted unique video ids.
+        video_codes (n_trials,): row of video_ids shown in each trial.
+        video_indptr (n_videos + 1,), video_trials (n_trials,): CSR mapping, the trials showing video i are
+            video_trials[video_indptr[i]:video_indptr[i + 1]].
+        video_counts (n_videos,): number of trials per video.
+        video_mean_rates (n_videos, n_neurons): trial-averaged rates per video.
+        test_videos: rows of video_ids that are test videos (shown in test trials).
+    """
+    fields = ("mean_rates", "expvar", "train_trials", "test_trials", "video_ids", "video_codes", "video_indptr",
+              "video_trials", "video_counts", "video_mean_rates", "test_videos", "fingerprint")
+
+    def __init__(self, arrays):
+        for field in self.fields:
+            setattr(self, field, arrays[field])
+
+    def neuron_mask(self, min_rate=1.0, min_expvar=0.4):
+        """
+        Boolean mask of neurons whose mean rate exceeds min_rate and whose explainable variance exceeds min_expvar.
+        """
+        return (self.mean_rates > min_rate) & (self.expvar > min_expvar)
+
+    def good_neurons(self, min_rate=1.0, min_expvar=0.4):
+        return np.flatnonzero(self.neuron_mask(min_rate, min_expvar))
+
+    def trials_for(self, video_id):
+        """
+        Indices of the trials in which video_id was shown.
+        """
+        row = np.searchsorted(self.video_ids, str(video_id))
+        if row == len(self.video_ids) or self.video_ids[row] != str(video_id):
+            return np.array([], dtype=self.video_trials.dtype)
+        return self.video_trials[self.video_indptr[row]:self.video_indptr[row + 1]]
+
+def fingerprint(data):
+    # cheap check that a cached index still matches the data
+    rates = np.asarray(data['rates'])
+    return np.array([rates.shape[0], rates.shape[1], float(rates[::97].sum()), float(np.asarray(data['expvar']).sum())])
+
+def build_index(data):
+    rates = np.asarray(data['rates'])
+    split = np.asarray(data['split']).astype(bool)
+    video_ids, video_codes = np.unique(np.asarray(data['videos']).astype(str), return_inverse=True)
+
+    video_trials = np.argsort(video_codes, kind='stable')
+    video_counts = np.bincount(video_codes, minlength=len(video_ids))
+    video_indptr = np.concatenate([[0], np.cumsum(video_counts)])
+    video_mean_rates = np.add.reduceat(rates[video_trials], video_indptr[:-1], axis=0) / video_counts[:, None]
+
+    return DataIndex({"mean_rates": rates.mean(axis=0),
+                      "expvar": np.asarray(data['expvar']),
+                      "train_trials": np.flatnonzero(split),
+                      "test_trials": np.flatnonzero(~split),
+                      "video_ids": video_ids,
+                      "video_codes": video_codes,
+                      "video_indptr": video_indptr,
+                      "video_trials": video_trials,
+                      "video_counts": video_counts,
+                      "video_mean_rates": video_mean_rates,
+                      "test_videos": np.unique(video_codes[~split]),
+                      "fingerprint": fingerprint(data)})
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_data_index(data=None, cache_path=index_path):
+    """
+    Return the DataIndex for data (default: the shared data of this process), built once per process and cached on disk.
+    The index of any other data is built on every call and neither kept nor written to cache_path.
+    """
+    global _index
+    if data is not None and data is not shared_data:
+        return build_index(data)
+    with _index_lock:
+        if _index is not None:
+            return _index
+        current = fingerprint(shared_data)
+
+        index = None
+        if cache_path is not None and os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached["fingerprint"], current):
+                    index = DataIndex({field: cached[field] for field in DataIndex.fields})
+        if index is None:
+            index = build_index(shared_data)
+            if cache_path is not None:
+                np.savez(cache_path, **{field: getattr(index, field) for field in DataIndex.fields})
+        _index = index
+        return index
@@ -1,12 +1,17 @@
-import cv2
 import numpy as np
 import pickle
+import json
+import os
+import threading
+
+data_path = './dataset/data.pkl'
+npy_dir = './dataset/data_npy' # columnar copy of data.pkl written by convert_data
 
 dataset_details = '''The dataset is from a Neuropixel recording in the middle temporal area (MT) collected while a monkey viewed 200 ms full screen natural videos. The middle temporal area is known for its role in motion processing, and for beautiful functional oranization of neurons into motion direction columns.
 
 The data has been preprocessed for you into the following format:
-1. data is a python dictionary with following keys and values - it is provided as a global variable you will always have access to. 
-    key: videos, shape: (4670 trials,), dtype: object --- specifies the id of the video shown in that trial.
+1. data is a python dictionary with following keys and values - it is provided as a global variable you will always have access to. The arrays may be read-only memory maps, so copy an array (np.array(data[key])) before modifying it in place.
+    key: videos, shape: (4670 trials,), dtype: <U36 (fixed-width unicode strings; treat them as strings and do not rely on object-array behaviour) --- specifies the id of the video shown in that trial.
         e.g., array(['bc24590b-13f5-4f18-a955-23775c525df2', 
                'ca6e9ec9-46ac-4a02-8034-7c31157dc52c',...])
     key: rates, shape: (4670 trials, 965 neurons), dtype: float64 --- the firing rate for each neuron in each trial (units of spikes/sec)
@@ -18,6 +23,23 @@ The data has been preprocessed for you into the following format:
 In each trial, one video is shown that is either a 'train' or 'test' video. Each train video is shown only once in the entire session. Each test video is shown multiple times throughout the session. Each video is a 5 frame color video of shape 360 (height) x 640 (width). 
 Some of the 'neurons' may not be real neurons and should be excluded from all analyses. This can be done with criteria such as, the neuron's average firing rate should exceed 1 Hz and its explainable variance should exceed .4 or .5.
 
+Common selections are precomputed, use them instead of recomputing them with loops:
+index = get_data_index()
+good = index.good_neurons(min_rate=1.0, min_expvar=0.4) # indices of neurons passing the criteria (index.neuron_mask(...) gives a boolean mask)
+index.train_trials, index.test_trials # trial indices of the train and test trials
+index.video_ids # sorted unique video ids; index.video_codes[t] is the row of index.video_ids shown in trial t
+index.trials_for(video_id) # trial indices in which a video was shown
+index.video_mean_rates # shape (n_videos, 965 neurons), trial-averaged rates per video, index.video_counts gives the number of trials per video
+index.test_videos # rows of index.video_ids that are test videos
+
+Fast, vectorized statistics over the repeated test videos are also available (all default to data['rates'] and the test videos):
+responses, counts = repeat_tensor() # shape (n_test_videos, max_repeats, 965 neurons), NaN-padded, and repeats per video
+reliability = split_half_reliability(n_splits=1000) # shape (965,), Spearman-Brown corrected split-half reliability per neuron
+explainable = noise_ceiling() # shape (965,), fraction of variance explainable by the stimulus per neuron
+correlations = noise_correlations(neurons=good) # noise correlation matrix between the given neurons
+
+The arrays in data are read-only (memory-mapped), so call .copy() before modifying one in place.
+
 print(data.keys()) # outputs dict_keys(['videos', 'rates', 'expvar', 'split', 'position'])
 
 If you want to load a video, this is how you could do it:  
@@ -25,14 +47,118 @@ video_path = "./dataset/stimuli/" + data['videos'][0] + ".mp4"
 video = load_video_to_numpy(video_path)
 print(video.shape) # outputs (5, 360, 640, 3)
 
+To load many videos at once (much faster than calling load_video_to_numpy in a loop, decoded frames are cached), use load_videos, which is also always available:
+videos = load_videos(data['videos'][:10])
+print(videos.shape) # outputs (10, 5, 360, 640, 3)
+
+Per-video stimulus features (mean_luminance, rms_contrast, motion_energy, optical_flow) are computed in parallel the first time they are needed and cached on disk. load_features returns them with one row per trial, aligned with data['videos']:
+features, columns = load_features()
+print(features.shape, columns) # outputs (4670, 6) ['mean_luminance', 'rms_contrast', 'motion_energy', 'optical_flow_0', 'optical_flow_1', 'optical_flow_2']
+New features can be added with the @register_feature("name") decorator on a function that takes one video array and returns a number or 1d array, then calling load_features().
+
 '''
 
-def load_data():
-    with open('./dataset/data.pkl', 'rb') as file:
+def convert_data(pkl_path=data_path, out_dir=npy_dir):
+    """
+    Convert the pickled data dictionary into one .npy file per key so load_data can memory-map it.
+    Object arrays (the video ids) are stored as fixed-width strings, and the video ids are additionally
+    stored as integer codes (video_codes.npy) into the sorted unique ids (video_ids.npy).
+    The manifest is written last, so a partially converted directory is never used.
+    """
+    with open(pkl_path, 'rb') as file:
+        data = pickle.load(file)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for key, value in data.items():
+        value = np.asarray(value)
+        if value.dtype == object:
+            value = value.astype(str)
+        np.save(os.path.join(out_dir, key + '.npy'), value, allow_pickle=False)
+
+    video_ids, video_codes = np.unique(np.asarray(data['videos']).astype(str), return_inverse=True)
+    np.save(os.path.join(out_dir, 'video_ids.npy'), video_ids, allow_pickle=False)
+    np.save(os.path.join(out_dir, 'video_codes.npy'), video_codes.astype(np.int32), allow_pickle=False)
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as file:
+        json.dump({"keys": list(data.keys()), "source": os.path.abspath(pkl_path)}, file)
+
+def load_data(pkl_path=data_path, data_dir=npy_dir):
+    """
+    Load the data dictionary. If convert_data has been run the arrays are memory-mapped read-only from
+    data_dir, so every process shares one page-cached copy; otherwise the pickle is loaded.
+    """
+    manifest_path = os.path.join(data_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            keys = json.load(file)["keys"]
+        return {key: np.load(os.path.join(data_dir, key + '.npy'), mmap_mode='r') for key in keys}
+
+    with open(pkl_path, 'rb') as file:
         data = pickle.load(file)
     return data
 
+class LazyData(dict):
+    """
+    The data dictionary, loaded by loader (default load_data) on first use: key or attribute access,
+    iteration, len, or any other dict method. Processes that never touch the data never load it.
+    """
+    def __init__(self, loader=load_data):
+        super().__init__()
+        self._loader = loader
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    super().update(self._loader())
+                    self._loaded = True
+        return self
+
+    def __getitem__(self, key):
+        return super(LazyData, self.load()).__getitem__(key)
+
+    def __getattr__(self, name):
+        # only reached for names that are not dict attributes
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self):
+        return super(LazyData, self.load()).__iter__()
+
+    def __len__(self):
+        return super(LazyData, self.load()).__len__()
+
+    def __contains__(self, key):
+        return super(LazyData, self.load()).__contains__(key)
+
+    def __repr__(self):
+        return super(LazyData, self.load()).__repr__()
+
+    def __eq__(self, other):
+        return super(LazyData, self.load()).__eq__(other)
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+for _name in ('keys', 'values', 'items', 'get', 'copy', 'pop', 'popitem', 'setdefault', 'update', 'clear', '__setitem__', '__delitem__'):
+    def _method(self, *args, _name=_name, **kwargs):
+        return getattr(super(LazyData, self.load()), _name)(*args, **kwargs)
+    _method.__name__ = _name
+    setattr(LazyData, _name, _method)
+del _name, _method
+
+# the data dictionary of this process, loaded once on first use; the dataset modules and the globals of
+# generated code (utils.code_utils.data) all share it, so the dataset is never loaded twice
+shared_data = LazyData(load_data)
+
 def load_video_to_numpy(video_path, max_frames=5):
+    import cv2 # imported on first use, it is slow to import and most processes never decode a video
     cap = cv2.VideoCapture(video_path)
     frames = []
 
@@ -48,3 +174,7 @@ def load_video_to_numpy(video_path, max_frames=5):
 
     cap.release()
     return np.array(frames)  # Shape: (num_frames, height, width, channels)
+
+if __name__ == "__main__":
+    convert_data()
+    print(f"converted {data_path} to {npy_dir}")
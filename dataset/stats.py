@@ -0,0 +1,109 @@
+import numpy as np
+
+from dataset.neuropixel import shared_data
+from dataset.indexes import get_data_index
+
+def _inputs(rates, index, videos):
+    if rates is None:
+        rates = shared_data['rates']
+    if index is None:
+        index = get_data_index()
+    if videos is None:
+        videos = index.test_videos
+    return np.asarray(rates), index, np.asarray(videos)
+
+def repeat_tensor(rates=None, index=None, videos=None):
+    """
+    Arrange the repeated presentations of videos (default: the test videos) into one array.
+
+    Returns:
+        responses (n_videos, max_repeats, n_neurons): rates of each repeat, NaN where a video has fewer repeats.
+        counts (n_videos,): number of repeats of each video.
+    """
+    rates, index, videos = _inputs(rates, index, videos)
+    counts = index.video_counts[videos]
+    responses = np.full((len(videos), counts.max(), rates.shape[1]), np.nan)
+    # trial t of video row v goes to repeat slot t - start of v in the CSR mapping
+    starts = index.video_indptr[videos]
+    video_of = np.repeat(np.arange(len(videos)), counts)
+    slot = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    trials = index.video_trials[np.repeat(starts, counts) + slot]
+    responses[video_of, slot] = rates[trials]
+    return responses, counts
+
+def split_half_reliability(rates=None, index=None, videos=None, n_splits=1000, chunk_size=100, spearman_brown=True, seed=0):
+    """
+    Split-half reliability of every neuron's responses across videos (default: the test videos).
+
+    For each of n_splits random splits, the repeats of every video are divided into two equal halves, the
+    half means are correlated across videos, and the correlations are averaged over splits. Splits are
+    processed chunk_size at a time as batched matrix products, which bounds memory at roughly
+    chunk_size x n_videos x n_neurons floats.
+
+    Returns:
+        reliability (n_neurons,): mean split-half correlation, Spearman-Brown corrected to full length by default.
+    """
+    rates, index, videos = _inputs(rates, index, videos)
+    responses, counts = repeat_tensor(rates, index, videos)
+    keep = counts >= 2
+    responses, counts = np.nan_to_num(responses[keep]), counts[keep]
+    n_videos, max_repeats, n_neurons = responses.shape
+    half = counts // 2
+    rng = np.random.default_rng(seed)
+
+    total = np.zeros(n_neurons)
+    for start in range(0, n_splits, chunk_size):
+        n = min(chunk_size, n_splits - start)
+        # random ranks of the repeats within each video, padding slots always rank last
+        keys = rng.random((n_videos, n, max_repeats))
+        keys[np.broadcast_to(np.arange(max_repeats) >= counts[:, None, None], keys.shape)] = np.inf
+        ranks = keys.argsort(axis=2).argsort(axis=2)
+        first = (ranks < half[:, None, None]).astype(float)
+        second = ((ranks >= half[:, None, None]) & (ranks < 2 * half[:, None, None])).astype(float)
+
+        # (n_videos, n, max_repeats) @ (n_videos, max_repeats, n_neurons) -> (n_videos, n, n_neurons)
+        a = (first @ responses) / half[:, None, None]
+        b = (second @ responses) / half[:, None, None]
+        a -= a.mean(axis=0)
+        b -= b.mean(axis=0)
+        denominator = np.sqrt((a * a).sum(axis=0) * (b * b).sum(axis=0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = (a * b).sum(axis=0) / denominator
+        total += np.nan_to_num(r).sum(axis=0)
+
+    reliability = total / n_splits
+    if spearman_brown:
+        reliability = 2 * reliability / (1 + reliability)
+    return reliability
+
+def noise_ceiling(rates=None, index=None, videos=None):
+    """
+    Fraction of each neuron's response variance that is explainable by the stimulus, estimated from the
+    repeats of videos (default: the test videos) as 1 - (mean within-video variance / total variance).
+
+    Returns:
+        explainable (n_neurons,): explainable variance fraction, clipped to [0, 1].
+    """
+    rates, index, videos = _inputs(rates, index, videos)
+    responses, counts = repeat_tensor(rates, index, videos)
+    responses = responses[counts >= 2]
+    noise_var = np.nanmean(np.nanvar(responses, axis=1, ddof=1), axis=0)
+    total_var = np.nanvar(responses.reshape(-1, responses.shape[2]), axis=0, ddof=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.clip(1 - noise_var / total_var, 0, 1)
+
+def noise_correlations(rates=None, index=None, videos=None, neurons=None):
+    """
+    Noise correlations between neurons: correlations of trial-to-trial residuals around each video's
+    mean response, pooled over the repeats of videos (default: the test videos).
+
+    Returns:
+        correlations (n_neurons, n_neurons), restricted to neurons if given.
+    """
+    rates, index, videos = _inputs(rates, index, videos)
+    responses, counts = repeat_tensor(rates, index, videos)
+    if neurons is not None:
+        responses = responses[:, :, neurons]
+    residuals = responses - np.nanmean(responses, axis=1, keepdims=True)
+    residuals = residuals[~np.isnan(residuals[:, :, 0])]
+    return np.corrcoef(residuals, rowvar=False)
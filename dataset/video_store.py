@@ -0,0 +1,114 @@
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+
+from dataset.neuropixel import shared_data, load_video_to_numpy
+
+stimuli_dir = './dataset/stimuli/'
+store_dir = './dataset/video_store' # pre-decoded frames written by build_video_store
+
+def build_video_store(video_ids=None, stimuli_dir=stimuli_dir, out_dir=store_dir, n_frames=5):
+    """
+    Decode every stimulus once into a memory-mapped uint8 tensor of shape
+    (n_videos, n_frames, height, width, 3) saved as frames.npy, with the video id of each row in ids.npy.
+    Videos with fewer than n_frames frames are zero-padded.
+    """
+    if video_ids is None:
+        video_ids = np.unique(np.asarray(shared_data['videos']).astype(str))
+    video_ids = [str(video_id) for video_id in video_ids]
+
+    first = load_video_to_numpy(os.path.join(stimuli_dir, video_ids[0] + ".mp4"), max_frames=n_frames)
+    shape = (len(video_ids), n_frames) + first.shape[1:]
+
+    os.makedirs(out_dir, exist_ok=True)
+    frames = np.lib.format.open_memmap(os.path.join(out_dir, 'frames.tmp.npy'), mode='w+', dtype=np.uint8, shape=shape)
+    for row, video_id in enumerate(video_ids):
+        video = first if row == 0 else load_video_to_numpy(os.path.join(stimuli_dir, video_id + ".mp4"), max_frames=n_frames)
+        frames[row, :len(video)] = video
+    frames.flush()
+    del frames
+
+    np.save(os.path.join(out_dir, 'ids.npy'), np.array(video_ids), allow_pickle=False)
+    os.replace(os.path.join(out_dir, 'frames.tmp.npy'), os.path.join(out_dir, 'frames.npy'))
+
+class VideoStore:
+    """
+    Access to stimulus frames without per-call decoder setup.
+
+    Videos present in the pre-decoded store are read straight from the memory-mapped tensor; anything
+    else is decoded once and kept in an LRU cache of cache_size videos.
+    """
+    def __init__(self, store_dir=store_dir, stimuli_dir=stimuli_dir, cache_size=256, n_frames=5):
+        self.stimuli_dir = stimuli_dir
+        self.cache_size = cache_size
+        self.n_frames = n_frames
+
+        self.frames = None
+        self.index = {}
+        frames_path = os.path.join(store_dir, 'frames.npy')
+        if os.path.exists(frames_path):
+            self.frames = np.load(frames_path, mmap_mode='r')
+            ids = np.load(os.path.join(store_dir, 'ids.npy'))
+            self.index = {str(video_id): row for row, video_id in enumerate(ids)}
+
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def decode(self, video_id):
+        with self.lock:
+            if video_id in self.cache:
+                self.cache.move_to_end(video_id)
+                return self.cache[video_id]
+        video = load_video_to_numpy(os.path.join(self.stimuli_dir, video_id + ".mp4"), max_frames=self.n_frames)
+        with self.lock:
+            self.cache[video_id] = video
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return video
+
+    def get(self, video_id):
+        video_id = str(video_id)
+        row = self.index.get(video_id)
+        if row is not None:
+            return self.frames[row]
+        return self.decode(video_id)
+
+    def load_videos(self, video_ids):
+        """
+        Return the videos for video_ids stacked into one array of shape (len(video_ids), n_frames, height, width, 3).
+        """
+        video_ids = [str(video_id) for video_id in video_ids]
+        rows = [self.index.get(video_id) for video_id in video_ids]
+        stored = [i for i, row in enumerate(rows) if row is not None]
+        if len(stored) == len(video_ids):
+            return np.asarray(self.frames[rows]) # one gather from the memory map
+
+        videos = {i: self.decode(video_ids[i]) for i in range(len(video_ids)) if rows[i] is None}
+        shape = self.frames.shape[2:] if self.frames is not None else next((v.shape[1:] for v in videos.values() if v.ndim == 4), (360, 640, 3))
+        out = np.zeros((len(video_ids), self.n_frames) + shape, dtype=np.uint8)
+        if stored:
+            out[stored] = self.frames[[rows[i] for i in stored]]
+        for i, video in videos.items():
+            out[i, :len(video)] = video
+        return out
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_video_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VideoStore()
+        return _store
+
+def load_videos(video_ids):
+    """
+    Load several videos by id as one uint8 array of shape (n_videos, 5, 360, 640, 3).
+    """
+    return get_video_store().load_videos(video_ids)
+
+if __name__ == "__main__":
+    build_video_store()
+    print(f"decoded stimuli into {store_dir}")
@@ -0,0 +1,84 @@
+import pickle
+from collections.abc import Mapping
+from types import MappingProxyType
+
+DIVIDE_ACTION = "Divide task into smaller subtasks"
+
+class ActionView(Mapping):
+    """
+    Read-only view of an ActionTable restricted to some of its actions, in table order.
+    Views hold references to the table's prompt entries, nothing is copied.
+    """
+    __slots__ = ("table", "keys_")
+
+    def __init__(self, table, keys):
+        self.table = table
+        self.keys_ = keys
+
+    def __getitem__(self, key):
+        if key not in self.keys_:
+            raise KeyError(key)
+        return self.table.actions[key]
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+    def __contains__(self, key):
+        return key in self.keys_
+
+class ActionTable:
+    """
+    Immutable action table shared by every node of a tree, with one cached view per depth.
+
+    Nodes at max_depth must not divide again; instead of each of them deep-copying the action dict
+    (prompt strings and debug prompt functions included) they all share the same view without the
+    divide action.
+    """
+    __slots__ = ("actions", "views")
+
+    def __init__(self, action_dict):
+        self.actions = MappingProxyType(dict(action_dict))
+        self.views = {}
+
+    def __reduce__(self):
+        # the prompts include lambdas, so tables are pickled by reference to their action names
+        return _find_table, (tuple(self.actions),)
+
+    def view(self, exclude=()):
+        exclude = frozenset(exclude)
+        view = self.views.get(exclude)
+        if view is None:
+            view = self.views.setdefault(exclude, ActionView(self, tuple(k for k in self.actions if k not in exclude)))
+        return view
+
+    def for_level(self, level, max_depth):
+        return self.view(exclude=(DIVIDE_ACTION,) if level >= max_depth else ())
+
+_tables = {} # id(action_dict) -> (action_dict, table), so every tree built from one dict shares one table
+
+def _find_table(names):
+    # the live table with these actions, or the default action table
+    for _, table in _tables.values():
+        if tuple(table.actions) == names:
+            return table
+    from prompts.action_prompts import action_dict
+    table = action_table(action_dict)
+    if tuple(table.actions) != names:
+        raise pickle.UnpicklingError(f"no action table with actions {names}")
+    return table
+
+def action_table(action_dict):
+    """
+    Return the shared ActionTable for action_dict, which may also be a table or a view of one.
+    """
+    if isinstance(action_dict, ActionTable):
+        return action_dict
+    if isinstance(action_dict, ActionView):
+        return action_dict.table
+    entry = _tables.get(id(action_dict))
+    if entry is None or entry[0] is not action_dict:
+        entry = _tables[id(action_dict)] = (action_dict, ActionTable(action_dict))
+    return entry[1]
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+class CacheMissError(RuntimeError):
+    """
+    Raised in replay-only mode when a request has no cached response.
+    """
+    pass
+
+class ResponseCache:
+    """
+    Persistent LLM response cache stored in a single SQLite file.
+
+    Entries are keyed on a sha256 of (model, messages, temperature), so re-running the same prompts
+    returns the stored completions instead of calling the model. The least recently used entries are
+    evicted once the cache exceeds max_entries or max_bytes. With replay_only=True a miss raises
+    CacheMissError instead of falling through to the model, which is useful for regression-testing
+    prompt and parsing changes offline.
+    """
+    def __init__(self, path="./logs/llm_cache.sqlite", max_entries=100000, max_bytes=512 * 2**20, replay_only=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                response TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                last_access REAL NOT NULL)""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model, messages, temperature):
+        payload = json.dumps({"model": model, "messages": messages, "temperature": temperature},
+                             sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+        if row is None:
+            if self.replay_only:
+                raise CacheMissError(f"no cached response for request {key[:12]} in replay-only mode")
+            return None
+        return row[0]
+
+    def put(self, key, response):
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                              (key, response, size, time.time()))
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # drop least recently used entries until we are back under both limits
+        n_entries, n_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if n_entries <= self.max_entries and n_bytes <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        to_delete = []
+        for key, size in rows:
+            if n_entries <= self.max_entries and n_bytes <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            n_entries -= 1
+            n_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def stats(self):
+        with self.lock:
+            n_entries, n_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "entries": n_entries, "bytes": n_bytes}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
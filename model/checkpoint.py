@@ -0,0 +1,142 @@
+import os
+import json
+import glob
+import threading
+
+class Checkpointer:
+    """
+    Incremental, per-node snapshots of a Task tree.
+
+    Each node is written to its own JSON file (node_<path>.json) as soon as it finishes, holding only its
+    plain state: prompt, action, result, value, subtask prompts and values and conversation history. LLM clients, loggers
+    and execution pools are never serialized. The comment list, function registry and dataset system
+    prompt shared by the whole tree are written to shared.json alongside, once per save. load_tree rebuilds the tree from these files, marking finished nodes as done
+    so the drivers skip them without repeating any LLM calls.
+    """
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        self.lock = threading.Lock()
+        self.system_prompt = None
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    @staticmethod
+    def node_name(path):
+        return "node_" + ("root" if len(path) == 0 else "-".join(str(i) for i in path)) + ".json"
+
+    def write_json(self, name, obj):
+        # write to a temporary file first so an interrupted run never leaves a truncated checkpoint
+        path = os.path.join(self.checkpoint_dir, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(obj, file)
+        os.replace(tmp_path, path)
+
+    def read_json(self, name):
+        path = os.path.join(self.checkpoint_dir, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def save_node(self, task, shared=True):
+        """
+        Write task's record and, unless shared is False, shared.json. The dataset system prompt that starts
+        every conversation is written once to shared.json instead of into every node's history.
+        """
+        from model.task import shared_state_lock, dataset_system_prompt
+        system_prompt = dataset_system_prompt(task.dataset_info)
+        with shared_state_lock:
+            history = list(task._lm.conversation_history) if task._lm is not None else [] # _lm, so no LLM is created
+            shared_system_prompt = bool(history) and history[0] == {"role": "system", "content": system_prompt}
+            record = {"path": list(task.path),
+                      "level": task.level,
+                      "task_prompt": task.task_prompt,
+                      "action": task.action,
+                      "result": task.result,
+                      "failed": task.failed,
+                      "done": task.done,
+                      "idea_list": list(task.idea_list),
+                      "value": task.value,
+                      "subtask_prompts": list(task.subtask_prompts),
+                      # children that never ran have no file of their own, their values are kept here
+                      "subtask_values": [subtask.value for subtask in task.subtasks],
+                      "shared_system_prompt": shared_system_prompt,
+                      "history": history[1:] if shared_system_prompt else history}
+        with self.lock:
+            self.write_json(self.node_name(task.path), record)
+        if shared:
+            self.save_shared(task)
+
+    def save_shared(self, task):
+        from model.task import shared_state_lock, dataset_system_prompt
+        with shared_state_lock:
+            shared = {"comment_list": list(task.comment_list), "registry": task.registry.state(),
+                      "system_prompt": dataset_system_prompt(task.dataset_info)}
+        with self.lock:
+            self.write_json("shared.json", shared)
+
+    def save_tree(self, task):
+        stack = [task]
+        while stack:
+            node = stack.pop()
+            self.save_node(node, shared=False)
+            stack.extend(node.subtasks)
+        self.save_shared(task)
+
+    def restore_node(self, task, record):
+        task.action = record["action"]
+        task.result = record["result"]
+        task.failed = record["failed"]
+        task.done = record["done"]
+        task.value = record.get("value", task.value)
+        history = record["history"]
+        if record.get("shared_system_prompt"):
+            history = [{"role": "system", "content": self.system_prompt}] + history
+        if history:
+            task.lm.context.load(history)
+
+    def restore_subtasks(self, task, values=None):
+        # values of the subtasks as saved with task, so a resumed best-first exploration keeps its order
+        if values is not None and len(values) != len(task.subtask_prompts):
+            values = None
+        task.spawn_subtasks(list(task.subtask_prompts), merge=False, values=values) # the saved prompts were already merged
+        records = [self.read_json(self.node_name(subtask.path)) for subtask in task.subtasks]
+
+        # siblings share one idea list that only grows, so the longest saved copy is the most recent one
+        saved_lists = [record["idea_list"] for record in records if record is not None]
+        if saved_lists:
+            longest = max(saved_lists, key=len)
+            if len(longest) > len(task.subtasks[0].idea_list):
+                task.subtasks[0].idea_list[:] = longest
+
+        for subtask, record in zip(task.subtasks, records):
+            if record is None:
+                continue
+            self.restore_node(subtask, record)
+            subtask.subtask_prompts = record["subtask_prompts"]
+            self.restore_subtasks(subtask, record.get("subtask_values"))
+
+    def load_tree(self, **task_kwargs):
+        """
+        Rebuild the tree saved in checkpoint_dir. task_kwargs are passed to the root Task (action_dict,
+        dataset_info, logging, model_name, max_depth, ...). Returns None if there is no root checkpoint.
+        """
+        from model.task import Task
+        record = self.read_json(self.node_name(()))
+        if record is None:
+            return None
+        shared = self.read_json("shared.json") or {"comment_list": []}
+        self.system_prompt = shared.get("system_prompt") # prepended to the histories saved without it
+
+        task = Task(level=0, task_prompt=record["task_prompt"], comment_list=shared["comment_list"],
+                    idea_list=record["idea_list"], checkpointer=self, **task_kwargs)
+        if "registry" in shared:
+            task.registry.load_state(shared["registry"])
+        self.restore_node(task, record)
+        task.subtask_prompts = record["subtask_prompts"]
+        self.restore_subtasks(task, record.get("subtask_values"))
+        return task
+
+def latest_checkpoint_dir(root_dir="./logs/checkpoints"):
+    dirs = sorted(d for d in glob.glob(os.path.join(root_dir, "*")) if os.path.isdir(d))
+    return dirs[-1] if dirs else None
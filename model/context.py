@@ -0,0 +1,124 @@
+def estimate_tokens(content):
+    """
+    Cheap token estimate (~4 characters per token for English text and code).
+    Images in multimodal content are counted as a fixed block.
+    """
+    if isinstance(content, str):
+        return len(content) // 4 + 1
+    tokens = 0
+    for part in content:
+        if part.get("type") == "text":
+            tokens += len(part["text"]) // 4 + 1
+        else:
+            tokens += 1000
+    return tokens
+
+class DropFailedTurns:
+    """
+    Remove turns flagged as failed (e.g. an unparseable reply that was retried, or code that did not run).
+    """
+    def __call__(self, window):
+        window.remove([i for i in range(len(window.messages) - 1) if window.failed[i]])
+
+class KeepLastN:
+    """
+    Keep system messages plus the last n messages.
+    """
+    def __init__(self, n=8):
+        self.n = n
+
+    def __call__(self, window):
+        n_messages = len(window.messages)
+        window.remove([i for i in range(max(n_messages - self.n, 0))
+                       if window.messages[i]["role"] != "system"])
+
+class SummarizeOldTurns:
+    """
+    Replace everything but system messages and the last keep_last messages with a summary written by
+    window.summarizer (a function taking a list of messages and returning a string).
+    """
+    def __init__(self, keep_last=4):
+        self.keep_last = keep_last
+
+    def __call__(self, window):
+        if window.summarizer is None:
+            return
+        old = [i for i in range(max(len(window.messages) - self.keep_last, 0))
+               if window.messages[i]["role"] != "system"]
+        if len(old) < 2:
+            return
+        summary = window.summarizer([window.messages[i] for i in old])
+        window.remove(old[1:])
+        window.replace(old[0], {"role": "system", "content": "Summary of the earlier conversation: " + summary})
+
+class ContextWindow:
+    """
+    Conversation history with a token budget.
+
+    Token counts are computed once per message when it is added and kept in a running total. When the
+    total exceeds token_budget, the policies are applied in order until the history fits again. The last
+    message (the prompt about to be sent) is never removed. token_budget=None keeps everything.
+    """
+    def __init__(self, token_budget=None, policies=None, count_tokens=estimate_tokens, summarizer=None):
+        self.token_budget = token_budget
+        self.policies = policies if policies is not None else [DropFailedTurns(), KeepLastN()]
+        self.count_tokens = count_tokens
+        self.summarizer = summarizer
+
+        self.messages = []
+        self.token_counts = []
+        self.failed = []
+        self.total_tokens = 0
+
+    def append(self, message):
+        n_tokens = self.count_tokens(message["content"])
+        self.messages.append(message)
+        self.token_counts.append(n_tokens)
+        self.failed.append(False)
+        self.total_tokens += n_tokens
+
+    def pop(self):
+        self.failed.pop()
+        self.total_tokens -= self.token_counts.pop()
+        return self.messages.pop()
+
+    def load(self, messages):
+        self.messages, self.token_counts, self.failed, self.total_tokens = [], [], [], 0
+        for message in messages:
+            self.append(message)
+
+    def copy(self):
+        other = ContextWindow(self.token_budget, self.policies, self.count_tokens, self.summarizer)
+        other.messages, other.token_counts, other.failed = list(self.messages), list(self.token_counts), list(self.failed)
+        other.total_tokens = self.total_tokens
+        return other
+
+    def mark_failed(self, n=2):
+        # flag the last n messages, by default the last prompt/response pair
+        for i in range(max(len(self.messages) - n, 0), len(self.messages)):
+            self.failed[i] = True
+
+    def remove(self, indices):
+        indices = set(indices)
+        if not indices:
+            return
+        keep = [i for i in range(len(self.messages)) if i not in indices]
+        self.total_tokens -= sum(self.token_counts[i] for i in indices)
+        self.messages = [self.messages[i] for i in keep]
+        self.token_counts = [self.token_counts[i] for i in keep]
+        self.failed = [self.failed[i] for i in keep]
+
+    def replace(self, index, message):
+        n_tokens = self.count_tokens(message["content"])
+        self.total_tokens += n_tokens - self.token_counts[index]
+        self.messages[index] = message
+        self.token_counts[index] = n_tokens
+        self.failed[index] = False
+
+    def fit(self):
+        if self.token_budget is None:
+            return
+        for policy in self.policies:
+            if self.total_tokens <= self.token_budget:
+                break
+            policy(self)
@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import time
+
+from model.llm import get_usage
+
+class Budget:
+    """
+    Global limits for one exploration: wall-clock seconds, LLM requests and tokens (prompt + completion).
+    None means unlimited.
+    """
+    def __init__(self, wall_time=None, llm_calls=None, tokens=None):
+        self.wall_time = wall_time
+        self.llm_calls = llm_calls
+        self.tokens = tokens
+
+    def remaining(self, used):
+        # used and the result are dicts with wall_time, llm_calls and tokens; unlimited entries are None
+        return {name: None if getattr(self, name) is None else getattr(self, name) - used[name]
+                for name in ("wall_time", "llm_calls", "tokens")}
+
+class BestFirstExplorer:
+    """
+    Budgeted alternative to run.process_subtasks.
+
+    Pending nodes wait in a priority frontier instead of being expanded depth-first. A node's priority
+    grows with the value its parent's divide response estimated for it and falls with its depth and
+    with the observed LLM cost of the branch it belongs to, relative to the average node:
+
+        value_weight * value / 10 - depth_weight * level - cost_weight * branch_cost / mean_node_cost
+
+    Before each node the explorer checks the budget against the average cost of the nodes processed so
+    far. Once the next node would not fit, exploration stops and the remaining (lowest-priority) nodes
+    are left unprocessed, so a resumed run can pick them up. Every node is processed exactly as in
+    run.process_subtasks (Task.process) and the tree can be saved as usual afterwards.
+    """
+    def __init__(self, budget, logging=None, value_weight=1.0, depth_weight=0.5, cost_weight=0.25, default_value=5.0):
+        self.budget = budget
+        self.logging = logging
+        self.value_weight = value_weight
+        self.depth_weight = depth_weight
+        self.cost_weight = cost_weight
+        self.default_value = default_value
+
+        self.frontier = [] # (-priority, insertion order, task)
+        self.order = itertools.count()
+        self.node_costs = [] # (seconds, llm calls, tokens) of every processed node
+        self.pruned = []
+        self.stop_reason = None
+        self.start = None
+        self.start_usage = None
+
+    def used(self):
+        usage = get_usage()
+        return {"wall_time": time.perf_counter() - self.start,
+                "llm_calls": usage["requests"] - self.start_usage["requests"],
+                "tokens": usage["prompt_tokens"] + usage["completion_tokens"]
+                          - self.start_usage["prompt_tokens"] - self.start_usage["completion_tokens"]}
+
+    def mean_cost(self):
+        # average (seconds, llm calls, tokens) per node, zeros before any node finished
+        if not self.node_costs:
+            return 0.0, 0.0, 0.0
+        n = len(self.node_costs)
+        return tuple(sum(cost[i] for cost in self.node_costs) / n for i in range(3))
+
+    def priority(self, task):
+        value = task.value if task.value is not None else self.default_value
+        priority = self.value_weight * value / 10 - self.depth_weight * task.level
+        mean_time = self.mean_cost()[0]
+        if task.parent is not None and mean_time > 0:
+            # the branch so far: the parent and the siblings that already ran
+            branch_cost = task.parent.subtree_llm_time()
+            priority -= self.cost_weight * branch_cost / mean_time
+        return priority
+
+    def push(self, tasks):
+        for task in tasks:
+            if task.done:
+                # already finished (e.g. restored from a checkpoint), its children may not be
+                self.push(task.subtasks)
+            else:
+                heapq.heappush(self.frontier, (-self.priority(task), next(self.order), task))
+
+    def out_of_budget(self):
+        """
+        Return the name of the budget the next node would exceed, or None.
+        """
+        remaining = self.budget.remaining(self.used())
+        expected = dict(zip(("wall_time", "llm_calls", "tokens"), self.mean_cost()))
+        for name, left in remaining.items():
+            if left is not None and (left <= 0 or left < expected[name]):
+                return name
+        return None
+
+    def run(self, task):
+        """
+        Process the subtasks below task (which has already taken its seed actions) in priority order
+        until the frontier is empty or the budget runs out. Returns a report dict.
+        """
+        self.start = time.perf_counter()
+        self.start_usage = get_usage()
+        self.push(task.subtasks)
+        while self.frontier:
+            self.stop_reason = self.out_of_budget()
+            if self.stop_reason is not None:
+                break
+            _, _, node = heapq.heappop(self.frontier)
+            before = self.used()
+            node.process()
+            after = self.used()
+            self.node_costs.append(tuple(after[name] - before[name] for name in ("wall_time", "llm_calls", "tokens")))
+            self.push(node.subtasks)
+
+        self.pruned = [node for _, _, node in sorted(self.frontier)]
+        self.frontier = []
+        if self.pruned and self.logging is not None:
+            self.logging.info(f"{self.stop_reason} budget reached, {len(self.pruned)} nodes left unprocessed: "
+                              + "; ".join(str(list(node.path)) for node in self.pruned))
+        return self.report()
+
+    def report(self):
+        used = self.used()
+        return {"nodes": len(self.node_costs),
+                "pruned": len(self.pruned),
+                "stop_reason": self.stop_reason,
+                "wall_time": used["wall_time"],
+                "llm_calls": used["llm_calls"],
+                "tokens": used["tokens"],
+                "budget": {"wall_time": self.budget.wall_time, "llm_calls": self.budget.llm_calls, "tokens": self.budget.tokens}}
@@ -1,39 +1,411 @@
-import openai
+import asyncio
+import atexit
+import threading
+import contextvars
 import base64
-import re
+import time
+import copy
+from contextlib import contextmanager
+
+from model.context import ContextWindow, estimate_tokens
+from utils.trace_utils import tracer
+from utils.response_utils import strip_think
+
+# connection settings shared by every LLM instance in the process
+client_config = {
+    "base_url": "http://localhost:11434/v1",
+    "api_key": "ollama",  # Authentication-free private access
+    "max_connections": 32,
+    "timeout": 600.0,  # seconds per request, reasoning models can be slow
+    "max_retries": 3,  # retried with exponential backoff by the openai client
+}
+
+_client = None
+_response_cache = None  # optional model.cache.ResponseCache shared by all instances
+_async_client = None  # bound to _loop, like every httpx async pool is bound to the loop that uses it
+_loop = None  # background event loop that runs every async request, see run_async
+_client_lock = threading.Lock()
+
+# requests sent to the server (cache hits excluded) and their token counts, over every LLM in the process
+_usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_usage_lock = threading.Lock()
+
+def get_usage():
+    """
+    Return a copy of the process-wide request and token counts.
+    """
+    with _usage_lock:
+        return dict(_usage)
+
+def _add_usage(prompt_tokens, completion_tokens):
+    with _usage_lock:
+        _usage["requests"] += 1
+        _usage["prompt_tokens"] += prompt_tokens
+        _usage["completion_tokens"] += completion_tokens
+
+def configure_clients(**kwargs):
+    """
+    Update the shared connection settings (base_url, api_key, max_connections, timeout, max_retries).
+    Clients created afterwards use the new settings.
+    """
+    global _client, _async_client
+    unknown = set(kwargs) - set(client_config)
+    if unknown:
+        raise ValueError(f"unknown client settings: {sorted(unknown)}")
+    with _client_lock:
+        client_config.update(kwargs)
+        _client = None
+        if _async_client is not None:
+            asyncio.run_coroutine_threadsafe(_async_client.close(), _loop)
+            _async_client = None
+
+def set_response_cache(cache):
+    """
+    Enable (or with None, disable) the persistent response cache for every LLM instance.
+    """
+    global _response_cache
+    _response_cache = cache
+
+# openai and httpx are imported by the client getters, they take most of the import time of this module
+def _limits():
+    import httpx
+    return httpx.Limits(max_connections=client_config["max_connections"],
+                        max_keepalive_connections=client_config["max_connections"])
+
+def get_client():
+    """
+    Return the process-wide synchronous client, so every Task reuses one keep-alive connection pool.
+    """
+    global _client
+    import openai, httpx
+    with _client_lock:
+        if _client is None:
+            _client = openai.Client(
+                base_url=client_config["base_url"],
+                api_key=client_config["api_key"],
+                timeout=client_config["timeout"],
+                max_retries=client_config["max_retries"],
+                http_client=httpx.Client(limits=_limits(), timeout=client_config["timeout"]),
+            )
+        return _client
+
+def _background_loop():
+    global _loop
+    with _client_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-async", daemon=True).start()
+            atexit.register(_close_async_client)
+        return _loop
+
+def _close_async_client():
+    # close the keep-alive connections of the async pool before the interpreter exits
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), _loop).result(timeout=5)
+        except Exception:
+            pass
+
+def run_async(coroutine):
+    """
+    Run coroutine on the process-wide background event loop and return its result. All async requests
+    run on this one long-lived loop, so they share one AsyncClient and its keep-alive connection pool
+    (a new loop per call, as with asyncio.run, would leave a client and its sockets behind every time).
+    The caller's context variables, such as the current trace span, are visible to the coroutine.
+    """
+    loop = _background_loop()
+    context = contextvars.copy_context()
+
+    async def start():
+        return await context.run(loop.create_task, coroutine)
+
+    return asyncio.run_coroutine_threadsafe(start(), loop).result()
+
+def _check_loop():
+    if asyncio.get_running_loop() is not _loop:
+        raise RuntimeError("async requests must run on the background loop, use model.llm.run_async")
+
+def get_async_client():
+    """
+    Return the process-wide async client. It can only be used by coroutines running on the background
+    loop, see run_async.
+    """
+    global _async_client
+    import openai, httpx
+    _check_loop()
+    with _client_lock:
+        if _async_client is None:
+            _async_client = openai.AsyncClient(
+                base_url=client_config["base_url"],
+                api_key=client_config["api_key"],
+                timeout=client_config["timeout"],
+                max_retries=client_config["max_retries"],
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=client_config["timeout"]),
+            )
+        return _async_client
+
+class RequestCancelled(Exception):
+    """
+    Raised by chat_with_model when its cancel event is set before the response is complete.
+    """
+    pass
+
+class ThinkFilter:
+    """
+    Removes <think>...</think> blocks from a response that arrives in chunks.
+    feed() returns the visible text contained in the new chunk; a tag split across chunks is held back
+    until it is complete.
+    """
+    open_tag, close_tag = "<think>", "</think>"
+
+    def __init__(self):
+        self.in_think = False
+        self.buffer = ""
+
+    def feed(self, chunk):
+        text = self.buffer + chunk
+        self.buffer = ""
+        visible = []
+        while text:
+            tag = self.close_tag if self.in_think else self.open_tag
+            idx = text.find(tag)
+            if idx == -1:
+                # keep a possible partial tag at the end for the next chunk
+                keep = 0
+                for k in range(min(len(tag) - 1, len(text)), 0, -1):
+                    if tag.startswith(text[-k:]):
+                        keep = k
+                        break
+                if not self.in_think:
+                    visible.append(text[:len(text) - keep])
+                self.buffer = text[len(text) - keep:]
+                break
+            if not self.in_think:
+                visible.append(text[:idx])
+            text = text[idx + len(tag):]
+            self.in_think = not self.in_think
+        return "".join(visible)
+
+class StreamState:
+    """
+    Accumulates a streamed completion, hides <think> blocks from the parser and records
+    time-to-first-token and time-to-answer. Without a stream_parser the whole completion is read.
+    """
+    def __init__(self, stream_parser):
+        self.stream_parser = stream_parser
+        self.think_filter = ThinkFilter()
+        self.parts = []
+        self.visible = ""
+        self.start = time.perf_counter()
+        self.first_token_time = None
+        self.answer_time = None
+
+    def feed(self, chunk):
+        # returns True once a complete answer has arrived and generation can be stopped
+        if not chunk.choices or not chunk.choices[0].delta.content:
+            return False
+        delta = chunk.choices[0].delta.content
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter() - self.start
+        self.parts.append(delta)
+        self.visible += self.think_filter.feed(delta)
+        if self.stream_parser is not None and self.stream_parser.feed(self.visible) is not None:
+            self.answer_time = time.perf_counter() - self.start
+            return True
+        return False
+
+    def finish(self, lm):
+        total_time = time.perf_counter() - self.start
+        lm.last_metrics = {"time_to_first_token": self.first_token_time,
+                           "time_to_answer": self.answer_time if self.answer_time is not None else total_time,
+                           "total_time": total_time,
+                           "cancelled_early": self.answer_time is not None}
+        if lm.logging is not None:
+            lm.logging.info(f"stream metrics: {lm.last_metrics}")
+        return "".join(self.parts)
 
 class LLM():
-    def __init__(self, model_name="deepseek-r1:32b", logging=None):
+    def __init__(self, model_name="deepseek-r1:32b", logging=None, token_budget=None, context_policies=None, system_prompt=None):
         self.logging = logging
-        self.client = openai.Client(
-            base_url="http://localhost:11434/v1",
-            api_key="ollama"  # Authentication-free private access
-        )
+        self.client = get_client()
     
-        # Initialize conversation history
-        self.conversation_history = []
+        # Initialize conversation history, trimmed by the context policies once it exceeds token_budget
+        self.context = ContextWindow(token_budget=token_budget, policies=context_policies, summarizer=self.summarize_messages)
+        if system_prompt is not None:
+            self.context.append({"role": "system", "content": system_prompt})
         self.model_name = model_name
+        self.temperature = 0.6
+        self.last_metrics = {} # timings of the most recent streamed request
+        self.request_time = 0.0 # seconds spent waiting for responses, over all requests
+
+    @property
+    def conversation_history(self):
+        return self.context.messages
+
+    def fork(self):
+        """
+        Return a copy of this LLM with its own copy of the conversation so far, sharing the client.
+        Used to explore alternative continuations (e.g. several candidate code fixes) concurrently.
+        """
+        other = copy.copy(self)
+        other.context = self.context.copy()
+        other.last_metrics = {}
+        return other
+
+    def mark_last_turn_failed(self):
+        """
+        Flag the last prompt/response pair so the context policies can drop it first.
+        """
+        self.context.mark_failed()
+
+    def summarize_messages(self, messages):
+        # one-off request that is not recorded in the conversation history
+        transcript = "\n\n".join(m["role"] + ": " + str(m["content"]) for m in messages)
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": "Summarize the following conversation, keeping every detail needed to continue the work "
+                                                  "(decisions, file names, function names, results):\n\n" + transcript}],
+            temperature=self.temperature)
+        usage = getattr(response, "usage", None)
+        _add_usage(usage.prompt_tokens if usage is not None else estimate_tokens(transcript),
+                   usage.completion_tokens if usage is not None else estimate_tokens(response.choices[0].message.content))
+        return strip_think(response.choices[0].message.content)
+
+    def chat_with_model(self, user_input, timeout=None, stream_parser=None, cancel=None):      
+        """
+        Send user_input and return the model's reply. With a stream_parser (see utils.string_utils.StreamParser)
+        the reply is streamed, and generation is stopped as soon as the parser has a complete, valid answer.
+        With a cancel event (threading.Event) the reply is always streamed, and once the event is set the
+        response is closed, so the server stops generating, and RequestCancelled is raised; the prompt is
+        then not kept in the conversation.
+        """
+        with tracer.span("llm", model=self.model_name, stream=stream_parser is not None or cancel is not None) as span, self.timed():
+            request = self.prepare_request(user_input)
+            cache, key, cached = self.lookup_cache(request)
+            span["cache_hit"] = cached is not None
+            if cached is not None:
+                return self.record_response(cached)
+        
+            # Send conversation history to model
+            if stream_parser is None and cancel is None:
+                response = self.client.chat.completions.create(timeout=timeout, **request)
+                content = response.choices[0].message.content
+            else:
+                stream = StreamState(stream_parser)
+                cancelled = False
+                response = self.client.chat.completions.create(timeout=timeout, stream=True, **request)
+                try:
+                    for chunk in response:
+                        if stream.feed(chunk):
+                            break
+                        if cancel is not None and cancel.is_set():
+                            cancelled = True
+                            break
+                finally:
+                    response.close()
+                content = stream.finish(self)
+                if cancelled:
+                    span["cancelled"] = True
+                    self.record_usage(span, response, content)
+                    self.context.pop()
+                    raise RequestCancelled("the request was cancelled before the response was complete")
+            self.record_usage(span, response, content)
+            if cache is not None:
+                cache.put(key, content)
+            return self.record_response(content)
 
-    def chat_with_model(self, user_input):      
+    async def achat_with_model(self, user_input, timeout=None, stream_parser=None):
+        """
+        Async version of chat_with_model, many nodes can await this concurrently over the shared pool.
+        Callers must run it on the background loop through run_async (e.g. run_async(lm.achat_with_model(prompt)));
+        on any other loop RuntimeError is raised before the conversation is changed. If the request fails,
+        the prompt is removed from the conversation again.
+        """
+        _check_loop()
+        with tracer.span("llm", model=self.model_name, stream=stream_parser is not None) as span, self.timed():
+            request = self.prepare_request(user_input)
+            cache, key, cached = self.lookup_cache(request)
+            span["cache_hit"] = cached is not None
+            if cached is not None:
+                return self.record_response(cached)
+
+            try:
+                if stream_parser is None:
+                    response = await get_async_client().chat.completions.create(timeout=timeout, **request)
+                    content = response.choices[0].message.content
+                else:
+                    stream = StreamState(stream_parser)
+                    response = await get_async_client().chat.completions.create(timeout=timeout, stream=True, **request)
+                    try:
+                        async for chunk in response:
+                            if stream.feed(chunk):
+                                break
+                    finally:
+                        await response.close()
+                    content = stream.finish(self)
+            except BaseException:
+                # also on cancellation, so no dangling user turn is left in the conversation
+                self.context.pop()
+                raise
+            self.record_usage(span, response, content)
+            if cache is not None:
+                cache.put(key, content)
+            return self.record_response(content)
+
+    @contextmanager
+    def timed(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.request_time += time.perf_counter() - start
+
+    def record_usage(self, span, response, content):
+        # token counts reported by the server, or estimated when it does not report them (e.g. when streaming)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            span["prompt_tokens"] = usage.prompt_tokens
+            span["completion_tokens"] = usage.completion_tokens
+        else:
+            span["prompt_tokens"] = self.context.total_tokens
+            span["completion_tokens"] = estimate_tokens(content)
+        if self.last_metrics and span.get("stream"):
+            span.update(self.last_metrics)
+        _add_usage(span["prompt_tokens"], span["completion_tokens"])
+
+    def lookup_cache(self, request):
+        # returns (cache, key, cached response or None)
+        cache = _response_cache
+        if cache is None:
+            return None, None, None
+        key = cache.make_key(request["model"], request["messages"], request["temperature"])
+        try:
+            return cache, key, cache.get(key)
+        except Exception:
+            # in replay-only mode a miss must not leave a dangling user turn in the history
+            self.context.pop()
+            raise
+
+    def prepare_request(self, user_input):
         if self.logging is not None:
-            self.logging.info("input: " + user_input)
+            self.logging.info("input: " + str(user_input))
         # Append user message to history
         user_input = self.construct_content(user_input)
-        self.conversation_history.append({"role": "user", "content": user_input})
-    
-        # Send conversation history to model
-        response = self.client.chat.completions.create(
-            model=self.model_name,  # Adjust model name as needed
-            messages=self.conversation_history,
-            temperature=0.6
-        )
-    
+        self.context.append({"role": "user", "content": user_input})
+        self.context.fit()
+        return {"model": self.model_name,  # Adjust model name as needed
+                "messages": self.conversation_history,
+                "temperature": self.temperature}
+
+    def record_response(self, assistant_response):
         # Extract assistant response
-        assistant_response = response.choices[0].message.content
-        assistant_response = re.sub(r'<think>.*?</think>', '', assistant_response, flags=re.DOTALL) # we remove COT from the history/return value
+        assistant_response = strip_think(assistant_response) # we remove COT from the history/return value
         
         # Append assistant response to history
-        self.conversation_history.append({"role": "assistant", "content": assistant_response})
+        self.context.append({"role": "assistant", "content": assistant_response})
         if self.logging is not None:
             self.logging.info("response: " + assistant_response)
         return assistant_response
@@ -42,10 +414,13 @@ class LLM():
         return user_input
 
 class VisionLLM(LLM):
-    def __init__(self, model_name="llama3.2-vision", logging=None):
+    def __init__(self, model_name="llama3.2-vision", logging=None, token_budget=None, context_policies=None, system_prompt=None):
         super().__init__(
             model_name=model_name,
             logging=logging,
+            token_budget=token_budget,
+            context_policies=context_policies,
+            system_prompt=system_prompt,
         )
         print("Initialized VisionLLM")
 
@@ -65,9 +440,12 @@ class VisionLLM(LLM):
         return content
         
 class TextLLM(LLM):
-    def __init__(self, model_name="deepseek-r1:32b", logging=None):
+    def __init__(self, model_name="deepseek-r1:32b", logging=None, token_budget=None, context_policies=None, system_prompt=None):
         super().__init__(
             model_name=model_name,
             logging=logging,
+            token_budget=token_budget,
+            context_policies=context_policies,
+            system_prompt=system_prompt,
         )
-        print("Initialized TextLLM")
\ No newline at end of file
+        print("Initialized TextLLM")
@@ -0,0 +1,72 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from model.task import select_actions
+
+class TreeScheduler:
+    """
+    Runs the nodes of a Task tree on a bounded pool of worker threads.
+
+    Siblings spawned by the "Divide task into smaller subtasks" action are independent, so as soon as a
+    node has taken its action, each of its subtasks is submitted to the pool. At most max_workers nodes
+    are in flight at any time. Every node is still processed exactly as in run.process_subtasks
+    (Task.process); only the ordering between independent nodes changes.
+    """
+    def __init__(self, max_workers=4, logging=None, batch_select=False):
+        self.max_workers = max_workers
+        self.batch_select = batch_select # select actions for all children of a node at once (model.task.select_actions)
+        self.logging = logging
+
+        self.lock = threading.Lock()
+        self.node_times = []    # wall-clock seconds spent inside each node
+        self.wall_time = 0.0
+        self.n_failed = 0
+
+    def run_node(self, task):
+        start = time.perf_counter()
+        try:
+            task.process()
+            if self.batch_select:
+                select_actions(task.subtasks)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.node_times.append(elapsed)
+        return task
+
+    def run(self, task):
+        """
+        Process every subtask below task (which has already taken its seed actions) and return a report dict.
+        """
+        start = time.perf_counter()
+        if self.batch_select:
+            select_actions(task.subtasks)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task") as executor:
+            pending = {executor.submit(self.run_node, subtask) for subtask in task.subtasks}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        node = future.result()
+                    except Exception as e:
+                        # a broken node should not bring down its siblings
+                        self.n_failed += 1
+                        if self.logging is not None:
+                            self.logging.info(f"node failed in scheduler: {e}")
+                        continue
+                    pending |= {executor.submit(self.run_node, subtask) for subtask in node.subtasks}
+        self.wall_time = time.perf_counter() - start
+        return self.report()
+
+    def report(self):
+        # node times are measured while nodes run concurrently, so they include waiting for exec_lock and
+        # in the server's queue; their sum, and the time saved and speedup derived from it, are upper bounds
+        serial_time = sum(self.node_times)
+        return {"nodes": len(self.node_times),
+                "failed": self.n_failed,
+                "max_workers": self.max_workers,
+                "wall_time": self.wall_time,
+                "serial_time_upper_bound": serial_time,
+                "time_saved_upper_bound": serial_time - self.wall_time,
+                "speedup_upper_bound": serial_time / self.wall_time if self.wall_time > 0 else 1.0}
@@ -9,108 +9,233 @@ import logging
 import os
 import pickle
 import datetime
+import threading
+import asyncio
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from model.llm import TextLLM, VisionLLM
+from model.llm import TextLLM, VisionLLM, RequestCancelled, run_async
+from model.actions import action_table
 from collections import OrderedDict
-from copy import deepcopy
+from functools import lru_cache
 
 from utils.string_utils import *
 from utils.history_utils import *
 from utils.code_utils import *
+from utils.trace_utils import tracer
+from utils.registry_utils import FunctionRegistry
+
+@lru_cache(maxsize=8)
+def dataset_system_prompt(dataset_info):
+    # identical for every node, so it is the start of every conversation's cached prefix; cached so all
+    # nodes hold the same string object
+    return "You are a scientist analyzing a dataset in order to make novel scientific discoveries.\n\nDataset Information: " + dataset_info
+
+def parse_value(value):
+    # a subtask's estimated value as a float clipped to 1..10, None if missing or not a number
+    try:
+        return min(max(float(value), 1.0), 10.0)
+    except (TypeError, ValueError):
+        return None
+
+# guards the idea/comment lists and code log shared between sibling nodes when the tree is run concurrently
+shared_state_lock = threading.RLock()
 
 class Task:
     """
     Class representing a task in the scientific research process.
+
+    Nodes are kept small so that wide and deep trees stay cheap: state lives in __slots__, the action
+    table is shared by the whole tree (see model.actions), the idea/comment lists and history builder are
+    shared between siblings, and the LLM (with its conversation) is only created once the node is used.
     """
-    def __init__(self, level, task_prompt, action_dict, comment_list, idea_list, dataset_info, logging, model_name='deepseek-r1:32b', max_depth=2):
+    __slots__ = ("level", "task_prompt", "action_dict", "action_list", "action",
+                 "comment_list", "idea_list", "dataset_info", "registry", "history",
+                 "model_name", "token_budget", "prefix_layout", "_lm",
+                 "max_depth", "exec_pool", "stream", "n_speculative", "debug_attempts",
+                 "path", "checkpointer", "done", "failed", "result", "subtasks", "subtask_prompts", "logging",
+                 "similarity", "duplicate_of", "parent", "value", "results_store")
+
+    # the same for every node
+    n_select_retries = 5
+    n_take_retries = 10
+    n_debug_steps = 10
+    n_reflections = 0
+
+    def __init__(self, level, task_prompt, action_dict, comment_list, idea_list, dataset_info, logging, model_name='deepseek-r1:32b', max_depth=2, token_budget=None, exec_pool=None, path=(), checkpointer=None, history=None, stream=False, prefix_layout=True, n_speculative=1, registry=None, similarity=None, parent=None, results_store=None):
         self.level = level
         self.task_prompt = task_prompt
-        self.action_dict = action_dict
-        self.action_list = list(action_dict.keys())
+        # nodes at max_depth get the shared view without the divide action
+        self.action_dict = action_table(action_dict).for_level(level, max_depth)
+        self.action_list = self.action_dict.keys_
         self.action = None
 
         self.comment_list = comment_list 
         self.idea_list = idea_list 
         self.dataset_info = dataset_info
+        self.registry = registry if registry is not None else FunctionRegistry() # shared by the whole tree
+        self.results_store = results_store # utils.results_utils.ResultsStore shared by the tree, or None for ./results.txt
+        self.history = history if history is not None else HistoryBuilder(idea_list, dataset_info, comment_list, registry=self.registry, results_store=results_store) # shared by siblings
 
-        self.model_name = model_name
-        self.lm = TextLLM(model_name=model_name, logging=logging)
+        self.model_name = sys.intern(model_name)
+        self.token_budget = token_budget
+        self.prefix_layout = prefix_layout # shared content first and the dataset in a system message, see layout_prompt
+        self._lm = None # created on first use, see lm
 
-        self.n_select_retries = 5
-        self.n_take_retries = 10
-        self.n_debug_steps = 10
-        self.n_reflections = 0
         self.max_depth = max_depth
+        self.exec_pool = exec_pool # utils.exec_pool.ExecPool, or None to exec code in this process
+        self.stream = stream # stream responses and stop generating once a parseable answer has arrived
+        self.n_speculative = n_speculative # candidate fixes requested concurrently per debug step, 1 for the serial loop
+        self.debug_attempts = [] # timings of speculative repair candidates
 
-        if self.level >= self.max_depth:
-            action_dict = deepcopy(self.action_dict)
-            key_to_remove =  "Divide task into smaller subtasks"
-            if key_to_remove in action_dict.keys():
-                del action_dict[key_to_remove]
+        self.path = path # index of this node among its siblings at every level, () for the root
+        self.parent = parent
+        self.similarity = similarity # utils.similarity_utils.SimilarityIndex shared by the tree, or None to keep duplicates
+        self.duplicate_of = None # an earlier node with a near-identical prompt, whose result this node reuses
+        self.value = None # the parent's estimate (1-10) of how much this subtask contributes, None if unknown
+        self.checkpointer = checkpointer # model.checkpoint.Checkpointer, or None
+        self.done = False # set once the node's action has been taken
 
         self.failed = False
         self.result = None
         self.subtasks = []
+        self.subtask_prompts = []
         
         self.logging = logging
-        
+
+    @property
+    def lm(self):
+        if self._lm is None:
+            system_prompt = dataset_system_prompt(self.dataset_info) if self.prefix_layout else None
+            self._lm = TextLLM(model_name=self.model_name, logging=self.logging, token_budget=self.token_budget, system_prompt=system_prompt)
+        return self._lm
+
+    @lm.setter
+    def lm(self, lm):
+        self._lm = lm
+
+    def __getstate__(self):
+        # loggers, clients, execution pools and checkpointers are not picklable (or meaningful elsewhere);
+        # the conversation is kept as plain messages and the LLM is recreated on first use after loading
+        state = {name: getattr(self, name) for name in self.__slots__ if name not in ("_lm", "logging", "exec_pool", "checkpointer")}
+        state["conversation_history"] = list(self._lm.conversation_history) if self._lm is not None else None
+        return state
+
+    def __setstate__(self, state):
+        conversation_history = state.pop("conversation_history")
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._lm = None
+        self.logging = logging
+        self.exec_pool = None
+        self.checkpointer = None
+        if conversation_history is not None:
+            self.lm.context.load(conversation_history)
+
+    def process(self):
+        """
+        Select and take an action for this node, unless it already finished (e.g. in a resumed run).
+        """
+        if self.done:
+            return
+        if self.reuse_duplicate():
+            self.done = True
+            self.checkpoint()
+            return
+        with tracer.span("node", level=self.level, path=list(self.path)):
+            if self.action is None: # may already have been chosen by select_actions
+                self.select_action()
+            self.take_action()
+        self.done = True
+        self.checkpoint()
+
     def select_action(self, retry_cnt=0):
         self.logging.info("selecting action for a node at " + str(self.level))
         
-        self.history_prompt = get_current_history(self.idea_list, self.dataset_info, self.comment_list)
-        
+        with tracer.span("select_action", level=self.level, path=list(self.path), retry=retry_cnt):
+            prompt = self.retry_note(self.selection_prompt(), retry_cnt)
+            stream_parser = selection_stream_parser(len(self.action_list)) if self.stream else None
+            action_select_response = self.lm.chat_with_model(prompt, stream_parser=stream_parser)
+            selected = self.apply_selection(action_select_response, retry_cnt)
+
+        if not selected:
+            self.select_action(retry_cnt=retry_cnt+1)
+
+    async def aselect_action(self):
+        """
+        Async version of select_action, used by select_actions to select for many nodes at once.
+        """
+        self.logging.info("selecting action for a node at " + str(self.level))
+        for retry_cnt in range(self.n_select_retries + 1):
+            with tracer.span("select_action", level=self.level, path=list(self.path), retry=retry_cnt, batched=True):
+                prompt = self.retry_note(self.selection_prompt(), retry_cnt)
+                stream_parser = selection_stream_parser(len(self.action_list)) if self.stream else None
+                action_select_response = await self.lm.achat_with_model(prompt, stream_parser=stream_parser)
+                selected = self.apply_selection(action_select_response, retry_cnt)
+            if selected:
+                return
+
+    def selection_prompt(self):
         action_start_prompt = "You are thinking about the following task. " 
         action_end_prompt =  ('''Instructions: Your current goal is to identify the best action to take to make progress on solving the task (but do not do the action). 
                     Think about which of the following choices is best to solve the task:\n''' +\
                     "\n".join([str(i+1) + ". " + self.action_list[i] + ": " + self.action_dict[self.action_list[i]]['select_action'] for i in range(len(self.action_list))]) +\
                     "\nInstruction: Your output should only contain the integer corresponding to the action you select enclosed in ** **, and a one sentence justification of your choice. Do not do the action that you selected. Do not write Python code.")
                                
-        prompt = combine_prompts([action_start_prompt, self.task_prompt, self.history_prompt, action_end_prompt])
+        # the action menu and history are the same for all siblings, so they go first and the task last; concurrent
+        # requests from siblings then share a prompt prefix the server can reuse
+        if self.prefix_layout:
+            return self.layout_prompt(action_end_prompt, action_start_prompt + self.task_prompt)
+        return combine_prompts([action_start_prompt, self.task_prompt, self.history.render(query=self.task_prompt), action_end_prompt])
 
-        action_select_response = self.lm.chat_with_model(prompt)
+    def retry_note(self, prompt, retry_cnt):
+        # the failed turn is dropped from the context, so without the note a retry would resend the same
+        # request (and with the response cache get the same unparseable answer back)
+        if retry_cnt == 0:
+            return prompt
+        return prompt + f"\n\nNote: this is attempt {retry_cnt + 1}, your previous answer could not be parsed. Follow the output format exactly."
 
+    def apply_selection(self, action_select_response, retry_cnt):
+        """
+        Parse a selection response and set self.action. Returns False if the caller should ask again.
+        """
         chosen_action = parse_action_selection(action_select_response)
         
         if (chosen_action == -1 or chosen_action > len(self.action_list) or chosen_action == 0):
             #if parsing failed, call the llm again
+            self.lm.mark_last_turn_failed()
             if retry_cnt < self.n_select_retries:
-                self.select_action(retry_cnt=retry_cnt+1)
-            else:
-                self.action = self.action_list[0] # brainstorm if we're struggling with parsing for some reason
-                self.logging.info("LM action failed to select, using: " + self.action)
+                return False
+            self.action = self.action_list[0] # brainstorm if we're struggling with parsing for some reason
+            self.logging.info("LM action failed to select, using: " + self.action)
         else:
             # if parsing worked set action
             self.action = self.action_list[chosen_action - 1] # we added one for the list numbering beacuse model probably more used to indexing from 1, so subtracing one here 
             self.logging.info("LM action selected: " + self.action)
+        return True
 
     def take_action(self, retry_cnt=0):
         self.logging.info("taking action " + self.action + " for a node at " + str(self.level) + "...")
         
-        if "brainstorm" in self.action.lower():
-            self.history_prompt = get_current_history(self.idea_list, self.dataset_info, self.comment_list, include_code=False)
-        elif "code" in self.action.lower():
-            self.history_prompt = get_current_history(self.idea_list, self.dataset_info, self.comment_list, include_results=False, include_ideas=False)
-        elif "divide" in self.action.lower():
-            self.history_prompt = get_current_history(self.idea_list, self.dataset_info, self.comment_list, include_ideas=True, include_code=False)
-        
-        action_start_prompt = self.action_dict[self.action]['take_action_start']
-        action_end_prompt = self.action_dict[self.action]['take_action_end']
-        
-        prompt = combine_prompts([action_start_prompt + self.task_prompt, self.history_prompt, action_end_prompt])
-        action_implement_response = self.lm.chat_with_model(prompt)
-        
-        for i in range(self.n_reflections):
-            prompt = self.action_dict[self.action]['take_action_revise']
-            action_implement_response = self.lm.chat_with_model(prompt)
+        with tracer.span("take_action", level=self.level, path=list(self.path), action=self.action, retry=retry_cnt) as span:
+            prompt = self.retry_note(self.action_prompt(), retry_cnt)
+            action_implement_response = self.lm.chat_with_model(prompt, stream_parser=self.stream_parser())
+            
+            for i in range(self.n_reflections):
+                prompt = self.action_dict[self.action]['take_action_revise']
+                action_implement_response = self.lm.chat_with_model(prompt, stream_parser=self.stream_parser())
 
-        try:
-            parsed_response = self.parse_action_response(action_implement_response)
-        except Exception as e:
-            logging.info(f"error when parsing action response: {e}")
-            parsed_response = None
+            try:
+                parsed_response = self.parse_action_response(action_implement_response)
+            except Exception as e:
+                logging.info(f"error when parsing action response: {e}")
+                parsed_response = None
+            span["parsed"] = parsed_response is not None
         
         if parsed_response is None:
             # if parsing failed, call the llm again
+            self.lm.mark_last_turn_failed()
             if retry_cnt < self.n_take_retries:
                 logging.info("parsing failed... retrying")
                 self.take_action(retry_cnt=retry_cnt+1)
@@ -120,7 +245,40 @@ class Task:
                 logging.info(f"Note - take action is struggling with parsing the following model output: {action_implement_response}")
                 return
 
-        self.implement_action(parsed_response)
+        with tracer.span("implement_action", level=self.level, path=list(self.path), action=self.action):
+            self.implement_action(parsed_response)
+
+    def action_prompt(self):
+        if "brainstorm" in self.action.lower():
+            history_flags = dict(include_code=False)
+        elif "code" in self.action.lower():
+            history_flags = dict(include_results=False, include_ideas=False)
+        elif "divide" in self.action.lower():
+            history_flags = dict(include_ideas=True, include_code=False)
+        
+        action_start_prompt = self.action_dict[self.action]['take_action_start']
+        action_end_prompt = self.action_dict[self.action]['take_action_end']
+        
+        if self.prefix_layout:
+            return self.layout_prompt(action_end_prompt, action_start_prompt + self.task_prompt, **history_flags)
+        return combine_prompts([action_start_prompt + self.task_prompt, self.history.render(query=self.task_prompt, **history_flags), action_end_prompt])
+
+    def layout_prompt(self, instructions, task_block, **history_flags):
+        """
+        Assemble a prompt from the most to the least shared content: the instructions for this kind of
+        request, the function catalogue, then ideas and results, and the node's own task last. The dataset
+        information is already in the system message, so nodes share as long a prefix as possible.
+        """
+        stable, variable = self.history.render_split(include_dataset=False, query=self.task_prompt, **history_flags)
+        return combine_prompts([block for block in [instructions, stable, variable, task_block] if block])
+
+    def stream_parser(self):
+        # incremental parser matching parse_action_response, or None when not streaming
+        if not self.stream:
+            return None
+        if "code" in self.action.lower():
+            return code_stream_parser()
+        return json_stream_parser()
 
     def parse_action_response(self, response):
         if "brainstorm" in self.action.lower():
@@ -132,71 +290,253 @@ class Task:
             
     def implement_action(self, parsed_response):
         if "brainstorm" in self.action.lower():
-            self.idea_list += parsed_response
+            with shared_state_lock:
+                self.idea_list += parsed_response
         elif "code" in self.action.lower():
             self.logging.info("executing and debugging code...")
             code = self.exec_debug_code(parsed_response)
             if not self.failed:
                 self.logging.info("code ran succesfully! parsing the code...")
 
-                # log all our python functions in one file
-                curr_function_dict = parse_functions(code)
-                for key in curr_function_dict:
-                    with open("./logs/code_log.py", "a") as file:
-                        file.write("\n\n\n")
-                        file.write(curr_function_dict[key])
-                                    
-                curr_comment_list = parse_comments(code)
-                self.comment_list += curr_comment_list
+                # log all our python functions in one file, each distinct function only once
+                with shared_state_lock:
+                    self.comment_list += self.registry.register(code)
         elif "divide" in self.action.lower():
             self.logging.info("splitting tasks...")
             self.subtasks = []
             new_task = None
             task_prompts = []
+            values = []
             for task_def in parsed_response:
+                values.append(parse_value(task_def.pop('value', None)))
                 if 'summary' in task_def.keys() and 'description' in task_def.keys():
                     task_prompt = ". ".join([task_def['summary'], task_def['description']])    
                 else:
                     self.logging.info(f'summary and description not in json {task_def}')
                     task_prompt = ""
                     for key in task_def.keys():
-                        task_prompt += "\n" + task_def[key] + "\n"
+                        task_prompt += "\n" + str(task_def[key]) + "\n"
                 task_prompts.append(task_prompt)
                 
-            idea_list = task_prompts    # idea list shared among the next level of nodes
-            for task_prompt in task_prompts:
-                if self.level + 1 == self.max_depth:
-                    action_dict = deepcopy(self.action_dict)
-                    key_to_remove =  "Divide task into smaller subtasks"
-                    if key_to_remove in action_dict.keys():
-                        del action_dict[key_to_remove]
-                else:
-                    action_dict = self.action_dict
-                new_task = Task(self.level+1, task_prompt, action_dict, self.comment_list, idea_list, self.dataset_info, self.logging,  model_name=self.model_name, max_depth=self.max_depth)
-                self.subtasks.append(new_task)
+            self.spawn_subtasks(task_prompts, values=values)
         self.summarize_result()
 
+    def spawn_subtasks(self, task_prompts, merge=True, values=None):
+        """
+        Create one child per prompt. With a similarity index, a prompt that nearly repeats one of its
+        siblings is merged into that sibling (no child is created, unless merge is False as when a saved
+        tree is restored), and a child that nearly repeats a node elsewhere in the tree is marked as its
+        duplicate and reuses its result, see reuse_duplicate. values are the model's estimates of how much
+        each subtask contributes (1-10, None if unknown), used by model.explorer to order the frontier.
+        """
+        task_prompts = list(task_prompts)
+        values = list(values) if values is not None else [None] * len(task_prompts)
+        idea_list = task_prompts    # idea list shared among the next level of nodes
+        history = HistoryBuilder(idea_list, self.dataset_info, self.comment_list, registry=self.registry, results_store=self.results_store)
+        ancestors = self.ancestors()
+        kept = []
+        for task_prompt, value in zip(task_prompts, values):
+            new_task = Task(self.level+1, task_prompt, self.action_dict, self.comment_list, idea_list, self.dataset_info, self.logging,  model_name=self.model_name, max_depth=self.max_depth, token_budget=self.token_budget, exec_pool=self.exec_pool, path=self.path + (len(kept),), checkpointer=self.checkpointer, history=history, stream=self.stream, prefix_layout=self.prefix_layout, n_speculative=self.n_speculative, registry=self.registry, similarity=self.similarity, parent=self, results_store=self.results_store)
+            new_task.value = value
+            if self.similarity is not None:
+                match, score, signature = self.similarity.find(task_prompt, exclude=ancestors)
+                if merge and match is not None and match.parent is self:
+                    self.logging.info(f"merged near-duplicate subtask ({score:.2f}) into its sibling: {task_prompt}")
+                    self.similarity.record("merge", task_prompt, match.duplicate_of or match)
+                    continue
+                if match is not None:
+                    new_task.duplicate_of = match.duplicate_of or match # always point at the node that does the work
+                self.similarity.add(new_task, signature)
+            kept.append(new_task)
+        idea_list[:] = [task.task_prompt for task in kept]
+        self.subtask_prompts = list(idea_list)
+        self.subtasks.extend(kept)
+
+    def ancestors(self):
+        node, ancestors = self, []
+        while node is not None:
+            ancestors.append(node)
+            node = node.parent
+        return ancestors
+
+    def reuse_duplicate(self):
+        """
+        Take over the action and result of the node this one duplicates, if it finished successfully.
+        Returns False if the node has to be processed itself.
+        """
+        original = self.duplicate_of
+        if original is None or not original.done or original.failed or original.result is None:
+            return False
+        self.logging.info(f"reusing the result of near-duplicate node {list(original.path)} for: {self.task_prompt}")
+        self.action = original.action
+        self.result = original.result
+        self.similarity.record("reuse", self.task_prompt, original)
+        return True
+
+    def subtree_llm_time(self):
+        # seconds this node and its descendants spent waiting for the LLM
+        own = self._lm.request_time if self._lm is not None else 0.0
+        return own + sum(subtask.subtree_llm_time() for subtask in self.subtasks)
+
+    def checkpoint(self):
+        if self.checkpointer is not None:
+            self.checkpointer.save_node(self)
+
     def exec_debug_code(self, code):
         debug_cnt = 0
         status = False
         default_error_prompt = self.action_dict[self.action]['debug_default'] # this is a function
         mnf_error_prompt = self.action_dict[self.action]['debug_mnf'] # this is a function
+        fix_pending = False # whether the code being run came from a debug turn
+        unparsed = 0 # debug turns in a row whose fix could not be parsed
+        known_result = None # (status, output) when a speculative repair already ran the code
         while debug_cnt < self.n_debug_steps and not status:
             # print("executing code...")
-            status, output = exec_and_get_error(code)
+            if known_result is not None:
+                status, output = known_result
+                known_result = None
+            elif self.registry.successful_output(code) is not None:
+                self.logging.info("equivalent code already ran successfully, reusing its output")
+                status, output = True, self.registry.successful_output(code)
+                self.replay_definitions(code)
+            else:
+                with tracer.span("exec", iteration=debug_cnt, worker=self.exec_pool is not None) as span:
+                    status, output = self.run_code(code)
+                    span["status"] = status
             if not status:
+                if fix_pending:
+                    self.lm.mark_last_turn_failed() # the proposed fix did not work, no need to keep it in context
                 # print("fixing error...")
                 if 'ModuleNotFoundError' in output:
                     error_response = self.lm.chat_with_model(mnf_error_prompt(output))
-                    exec(parse_action_code(error_response), globals())
+                    self.lm.mark_last_turn_failed() # install snippets are not useful context later on
+                    fix_pending = False
+                    try:
+                        install_code = parse_action_code(error_response)
+                    except ValueError as e:
+                        self.logging.info(f"could not parse the install code: {e}")
+                    else:
+                        with exec_lock:
+                            exec(install_code, globals())
+                elif self.n_speculative > 1:
+                    fix, fix_status, fix_output = self.speculative_repair(self.retry_note(default_error_prompt(output, code), unparsed), debug_cnt)
+                    if fix is not None:
+                        code, status, output = fix, fix_status, fix_output
+                    unparsed = unparsed + 1 if fix is None else 0
+                    known_result = (status, output)
+                    fix_pending = True
                 else:
-                    code = parse_action_code(self.lm.chat_with_model(default_error_prompt(output, code)))
+                    try:
+                        code = parse_action_code(self.lm.chat_with_model(self.retry_note(default_error_prompt(output, code), unparsed), stream_parser=self.stream_parser()))
+                        unparsed = 0
+                    except ValueError as e:
+                        # an unparseable fix is a failed debug step, the code and its error stay as they were
+                        self.logging.info(f"could not parse the code fix: {e}")
+                        known_result = (False, output)
+                        unparsed += 1
+                    fix_pending = True
             debug_cnt += 1
         
         if not status:
             self.failed = True
+        else:
+            self.registry.mark_succeeded(code, output)
         return code
 
+    def speculative_repair(self, error_prompt, iteration):
+        """
+        Ask for n_speculative candidate fixes concurrently, each on its own fork of the conversation, and run
+        each candidate as soon as it arrives. The first candidate that runs cleanly wins and the remaining ones
+        are cancelled: requests still generating are closed so the server stops working on them, and code that
+        has not started is not executed. Candidates run in the exec pool's worker processes; without a pool they
+        run in this process one at a time and share its globals. The winning branch's conversation becomes
+        this node's conversation. If no candidate works, the first one to finish is kept so the serial debug
+        loop can continue from its error. Per-candidate timings are appended to self.debug_attempts.
+
+        Returns (code, status, output) of the kept candidate, with code None if no response had a code block.
+        """
+        stop = threading.Event()
+
+        def attempt(candidate, lm):
+            start = time.perf_counter()
+            with tracer.span("repair_candidate", iteration=iteration, candidate=candidate) as span:
+                code = None
+                try:
+                    code = parse_action_code(lm.chat_with_model(error_prompt, stream_parser=self.stream_parser(), cancel=stop))
+                except RequestCancelled:
+                    status, output = False, "cancelled"
+                except Exception as e:
+                    status, output = False, f"could not parse a code block from the response: {e}"
+                llm_time = time.perf_counter() - start
+                if code is not None:
+                    if stop.is_set():
+                        status, output = False, "cancelled"
+                    else:
+                        status, output = self.run_code(code)
+                span["status"] = status
+            self.debug_attempts.append({"iteration": iteration, "candidate": candidate, "status": status, "cancelled": output == "cancelled",
+                                        "llm_time": llm_time, "exec_time": time.perf_counter() - start - llm_time})
+            return lm, code, status, output
+
+        # slightly different temperatures diversify the candidates (and keep their response cache keys distinct)
+        forks = [self.lm.fork() for _ in range(self.n_speculative)]
+        for i, lm in enumerate(forks):
+            lm.temperature = self.lm.temperature + 0.1 * i
+
+        executor = ThreadPoolExecutor(max_workers=self.n_speculative, thread_name_prefix="repair")
+        futures = [executor.submit(contextvars.copy_context().run, attempt, i, lm) for i, lm in enumerate(forks)]
+        kept = None
+        try:
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.logging.info(f"speculative repair candidate failed: {e}")
+                    continue
+                # prefer a candidate that ran, then one that at least produced code
+                if kept is None or (result[2], result[1] is not None) > (kept[2], kept[1] is not None):
+                    kept = result
+                if result[2]:
+                    stop.set()
+                    break
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if kept is None or kept[1] is None:
+            # every candidate errored before producing code, fall back to one ordinary request
+            try:
+                code = parse_action_code(self.lm.chat_with_model(error_prompt, stream_parser=self.stream_parser()))
+            except ValueError as e:
+                return None, False, f"could not parse a code block from the response: {e}"
+            return code, *self.run_code(code)
+        lm, code, status, output = kept
+        lm.temperature = self.lm.temperature
+        self.lm = lm
+        return code, status, output
+
+    def replay_definitions(self, code):
+        # a skipped snippet's imports and functions may not be defined in this process or the exec pool
+        # (e.g. after --resume, or in a fresh pool), so define them without running the rest of the snippet
+        if self.exec_pool is not None:
+            self.exec_pool.add_definitions(code)
+            return
+        try:
+            definitions = parse_definitions(code)
+        except SyntaxError:
+            return
+        for source in definitions:
+            exec_and_get_error(source)
+
+    def run_code(self, code):
+        # results the code saves with record_result are attributed to this node
+        context = None
+        if self.results_store is not None:
+            context = {"results_path": self.results_store.path, "node": list(self.path), "task_prompt": self.task_prompt}
+        if self.exec_pool is not None:
+            return self.exec_pool.run(code, context)
+        return exec_and_get_error(code, context)
+
     def summarize_result(self):
         summarize_prompt = ("Your task was to: " + self.task_prompt + "\n\n"
                             "Please summarize what you have done to acheive that goal, and include all details that might be relevant "
@@ -205,6 +545,25 @@ class Task:
                              "If you saved any statistical results text, describe where they are saved and what they contain.")
 
         if self.result is None:
-            response = self.lm.chat_with_model(summarize_prompt)
+            with tracer.span("summarize_result"):
+                response = self.lm.chat_with_model(summarize_prompt)
             self.result = response
-        
\ No newline at end of file
+            if self.results_store is not None:
+                self.results_store.add(response, node=self.path, task_prompt=self.task_prompt, kind="summary")
+        
+
+def select_actions(tasks):
+    """
+    Select actions for several nodes (typically the children of one divide) with concurrent requests
+    over the shared async client (on the background loop of model.llm.run_async), instead of one
+    blocking round-trip per node. Each node keeps its own retry handling. Nodes that already have an
+    action are skipped.
+    """
+    tasks = [task for task in tasks if task.action is None and not task.done]
+    if not tasks:
+        return
+
+    async def select_all():
+        await asyncio.gather(*[task.aselect_action() for task in tasks])
+
+    run_async(select_all())
@@ -15,7 +15,8 @@ from collections import OrderedDict
 # code specific prompts + functions
 code_format = ("The Python code should be enclosed within triple backticks ``` ```. " 
                    "You MUST make at least one plot in the code, and save it with plt.savefig to the ./outputs/ directory." 
-                    "You MUST save at least one numeric/statistical result related to the task in a text file with file.write(...) to the ./outputs/ directory." 
+                    "You MUST save at least one numeric/statistical result related to the task in a text file with file.write(...) to the ./outputs/ directory, "
+                    "and also pass each such result as a short self-contained sentence to record_result(text), which is provided to you as a global function, so later tasks can find it." 
                     "ALWAYS use the REAL data not simulated data. The variable 'data' is provided to you as a global variable which has already been loaded."
                    "Please write code in multiple functions when possible. Any function should include a comment at the beginning containg a description of the function, and the expected input(s) and output(s), including their types.")
 
@@ -38,15 +39,18 @@ def install(package):
 json_example = '''[
     {
         "summary": "Write a project proposal",
-        "description": "Draft a comprehensive project proposal outlining the objectives, scope, timeline, and expected outcomes. Include background research, methodology, and resource requirements to ensure clarity for stakeholders."
+        "description": "Draft a comprehensive project proposal outlining the objectives, scope, timeline, and expected outcomes. Include background research, methodology, and resource requirements to ensure clarity for stakeholders.",
+        "value": 6
     },
     {
         "summary": "Collect and preprocess data",
-        "description": "Gather relevant datasets from multiple sources and clean the data by handling missing values, removing duplicates, and normalizing formats. Perform exploratory data analysis to identify trends and potential issues."
+        "description": "Gather relevant datasets from multiple sources and clean the data by handling missing values, removing duplicates, and normalizing formats. Perform exploratory data analysis to identify trends and potential issues.",
+        "value": 9
     },
     {
         "summary": "Write test cases",
-        "description": "Design and implement unit and integration tests to ensure code reliability and functionality. Automate testing where possible and document edge cases to improve overall software robustness."
+        "description": "Design and implement unit and integration tests to ensure code reliability and functionality. Automate testing where possible and document edge cases to improve overall software robustness.",
+        "value": 4
     },
 ]'''
 
@@ -77,9 +81,10 @@ divide_dict = {"select_action": "If the task is too large or challenging to addr
                     "You have decided to begin addressing this task by breaking it down into smaller subtasks. Think deeply about what subtasks you need to do to acheive the overall goal, and identify a sequence of subtasks that should be performed to acheive the goal."  
                     "The subtasks should be ordered. The first subtasks that you do should help you with completing later subtasks. Ensure that by the final subtask, you will have completed the overall goal. \n\n"
                     "Instructions:\n"
-                    "Generate a JSON-formatted list of tasks you would need to perform. Each task should be represented as a dictionary with two keys:\n"
+                    "Generate a JSON-formatted list of tasks you would need to perform. Each task should be represented as a dictionary with three keys:\n"
                     "summary: A one-sentence summary of the task.\n"
                     "description: A thorough, multi-sentence explanation of the task.\n"
+                    "value: An integer from 1 to 10 estimating how much the task contributes to the overall goal.\n"
                     "The output should be strictly in JSON format, containing only the JSON data without any additional text.\n"
                     "An example of the output format is: \n"
                     ) + json_example, 
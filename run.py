@@ -1,16 +1,25 @@
 import logging
 import os
-import pickle
-import datetime
+import argparse
+from datetime import datetime
 
 from prompts.action_prompts import action_dict
 from dataset.neuropixel import dataset_details, load_data, load_video_to_numpy
-from model.task import Task
+from model.task import Task, select_actions
+from model.scheduler import TreeScheduler
+from model.explorer import Budget, BestFirstExplorer
+from model.cache import ResponseCache
+from model.llm import set_response_cache
+from utils.exec_pool import ExecPool
+from utils.trace_utils import tracer
+from utils.similarity_utils import SimilarityIndex
+from utils.results_utils import ResultsStore
+from model.checkpoint import Checkpointer, latest_checkpoint_dir
 
-def setup_logging():
+def setup_logging(append=False):
     log_file = './logs/recurse_log.txt'
 
-    if os.path.exists(log_file):
+    if os.path.exists(log_file) and not append:
         os.remove(log_file)
         
     # Ensure the directory exists (if logging to a subdirectory)
@@ -21,42 +30,130 @@ def setup_logging():
         filename=log_file,  # Log file name
         level=logging.INFO,  # Log level (INFO, DEBUG, WARNING, etc.)
         format='%(asctime)s - %(levelname)s - %(message)s',  # Log format
-        filemode='w'  # Overwrite the file each time (use 'a' to append)
+        filemode='a' if append else 'w'  # Overwrite the file each time, unless we are resuming a run
     )
     return logging
 
-def process_subtasks(task):
+def process_subtasks(task, batch_select=False):
+    if batch_select:
+        select_actions(task.subtasks)
     for subtask in task.subtasks:
-        subtask.select_action()
-        subtask.take_action()
-        process_subtasks(subtask)
+        subtask.process()
+        process_subtasks(subtask, batch_select=batch_select)
 
-def main():    
+def main(max_workers=1, cache_path=None, replay_only=False, token_budget=None, exec_workers=0, resume_dir=None, stream=False, batch_select=False, trace_path=None, n_speculative=1, dedup_threshold=None, budget=None):    
     base_prompt = "Your overall goal is to make novel scientific discoveries about a dataset you are provided with."
-    logging = setup_logging()
+    logging = setup_logging(append=resume_dir is not None)
+    if trace_path is not None:
+        tracer.enable(os.path.splitext(trace_path)[0] + ".jsonl")
 
-    task=Task(level=0, task_prompt=base_prompt, action_dict=action_dict, comment_list=[], idea_list=[], dataset_info=dataset_details, logging=logging, model_name='deepseek-r1', max_depth=2)
+    cache = None
+    if cache_path is not None:
+        cache = ResponseCache(cache_path, replay_only=replay_only)
+        set_response_cache(cache)
 
-    # take two seed actions
-    task.action = "Brainstorm"
-    task.take_action()
-    
-    task.action = "Divide task into smaller subtasks"
-    task.take_action()
+    exec_pool = ExecPool(n_workers=exec_workers) if exec_workers > 0 else None
+
+    similarity = SimilarityIndex(threshold=dedup_threshold) if dedup_threshold is not None else None
+
+    checkpointer = Checkpointer(resume_dir if resume_dir is not None else os.path.join("./logs/checkpoints", datetime.now().strftime("%Y%m%d_%H%M%S")))
+
+    # results live with the checkpoint so a resumed run sees them; an old results.txt is carried over once
+    results_store = ResultsStore(os.path.join(checkpointer.checkpoint_dir, "results.sqlite"))
+    if results_store.count() == 0 and os.path.exists("./results.txt"):
+        results_store.import_file("./results.txt")
+
+    task_kwargs = dict(action_dict=action_dict, dataset_info=dataset_details, logging=logging, model_name='deepseek-r1', max_depth=2, token_budget=token_budget, exec_pool=exec_pool, stream=stream, n_speculative=n_speculative, similarity=similarity, results_store=results_store)
+    task = None
+    if resume_dir is not None:
+        task = checkpointer.load_tree(**task_kwargs)
+        print(f"Resuming from {resume_dir}" if task is not None else f"No checkpoint in {resume_dir}, starting a new run")
+    if task is None:
+        task=Task(level=0, task_prompt=base_prompt, comment_list=[], idea_list=[], checkpointer=checkpointer, **task_kwargs)
+
+    # take two seed actions (skipped when resuming a run that already took them)
+    if not task.done:
+        if len(task.idea_list) == 0:
+            task.action = "Brainstorm"
+            task.take_action()
+            task.checkpoint()
+        
+        task.action = "Divide task into smaller subtasks"
+        task.take_action()
+        task.done = True
+        task.checkpoint()
 
-    # recurse
-    process_subtasks(task)
+    # recurse, either depth-first one node at a time, with siblings running concurrently, or best-first within a budget
+    if budget is not None:
+        report = BestFirstExplorer(budget, logging=logging).run(task)
+        logging.info(f"explorer report: {report}")
+        print(f"Processed {report['nodes']} nodes in {report['wall_time']:.1f}s with {report['llm_calls']} LLM calls "
+              f"and {report['tokens']} tokens" + (f", {report['pruned']} nodes left unprocessed ({report['stop_reason']} budget)" if report['pruned'] else ""))
+    elif max_workers > 1:
+        report = TreeScheduler(max_workers=max_workers, logging=logging, batch_select=batch_select).run(task)
+        logging.info(f"scheduler report: {report}")
+        print(f"Processed {report['nodes']} nodes in {report['wall_time']:.1f}s "
+              f"(serial estimate at most {report['serial_time_upper_bound']:.1f}s, saved at most {report['time_saved_upper_bound']:.1f}s)")
+    else:
+        process_subtasks(task, batch_select=batch_select)
     
-    # Save the task object with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    save_path = f"./logs/task_state_{timestamp}.pkl"
-    print(f"\nSaving task state to {save_path}...")
-    with open(save_path, 'wb') as f:
-        pickle.dump(task, f)
-    print("Task state saved successfully!")
+    if exec_pool is not None:
+        exec_pool.close()
+
+    if similarity is not None:
+        report = similarity.report(cost=Task.subtree_llm_time)
+        logging.info(f"near-duplicate subtasks: {report}")
+        print(f"Near-duplicate subtasks: merged {report['merged']}, reused {report['reused']} results, "
+              f"saving about {report['llm_time_saved']:.1f}s of LLM time")
+
+    if cache is not None:
+        logging.info(f"response cache: {cache.stats()}")
+        print(f"Response cache: {cache.stats()}")
+
+    if trace_path is not None:
+        if trace_path.endswith(".json"):
+            tracer.save_chrome_trace(trace_path)
+        summary = tracer.summary()
+        logging.info("trace summary:\n" + summary)
+        print(summary)
+
+    logging.info(f"{results_store.count()} results saved to {results_store.path}")
+    results_store.close()
+
+    # every node was checkpointed as it finished, write the whole tree once more so the final state is complete
+    checkpointer.save_tree(task)
+    print(f"\nTask tree saved to {checkpointer.checkpoint_dir}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="number of sibling subtasks to run concurrently")
+    parser.add_argument("--cache", nargs="?", const="./logs/llm_cache.sqlite", default=None, help="cache LLM responses in this SQLite file")
+    parser.add_argument("--replay-only", action="store_true", help="only serve responses from the cache, fail on a miss")
+    parser.add_argument("--token-budget", type=int, default=None, help="approximate per-node context size in tokens before old turns are dropped")
+    parser.add_argument("--exec-workers", type=int, default=0, help="run generated code in this many warm worker processes instead of in-process")
+    parser.add_argument("--stream", action="store_true", help="stream responses and stop generation once a complete answer has been parsed")
+    parser.add_argument("--batch-select", action="store_true", help="select actions for all children of a node with concurrent requests")
+    parser.add_argument("--speculative-fixes", type=int, default=1, help="candidate code fixes to request and run concurrently per debug step, each in its own exec worker (requires --exec-workers)")
+    parser.add_argument("--trace", nargs="?", const="./logs/trace.json", default=None, help="record timing spans to <name>.jsonl (and a Chrome trace if the path ends in .json)")
+    parser.add_argument("--dedup", nargs="?", type=float, const=0.8, default=None, help="merge or reuse subtasks whose prompts are at least this similar (MinHash estimate of Jaccard similarity)")
+    parser.add_argument("--budget-time", type=float, default=None, help="explore best-first and stop after about this many seconds")
+    parser.add_argument("--budget-calls", type=int, default=None, help="explore best-first and stop after about this many LLM requests")
+    parser.add_argument("--budget-tokens", type=int, default=None, help="explore best-first and stop after about this many prompt + completion tokens")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None, help="resume from a checkpoint directory (default: the most recent one)")
+    args = parser.parse_args()
+    if args.replay_only and args.cache is None:
+        parser.error("--replay-only requires --cache")
+    if args.speculative_fixes > 1 and args.exec_workers < 1:
+        parser.error("--speculative-fixes runs the candidates in isolated workers and requires --exec-workers")
+    resume_dir = latest_checkpoint_dir() if args.resume == "latest" else args.resume
+    if args.resume is not None and resume_dir is None:
+        parser.error("--resume: no checkpoint found under ./logs/checkpoints")
+    budget = None
+    if any(limit is not None for limit in (args.budget_time, args.budget_calls, args.budget_tokens)):
+        if args.workers > 1:
+            parser.error("--budget-* explores one node at a time and cannot be combined with --workers")
+        budget = Budget(wall_time=args.budget_time, llm_calls=args.budget_calls, tokens=args.budget_tokens)
+    main(max_workers=args.workers, cache_path=args.cache, replay_only=args.replay_only, token_budget=args.token_budget, exec_workers=args.exec_workers, resume_dir=resume_dir, stream=args.stream, batch_select=args.batch_select, trace_path=args.trace, n_speculative=args.speculative_fixes, dedup_threshold=args.dedup, budget=budget)
     
 
 
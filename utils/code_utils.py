@@ -9,22 +9,57 @@ import logging
 import os
 import pickle
 import datetime
+import threading
 
 from prompts.action_prompts import action_dict
-from dataset.neuropixel import dataset_details, load_data, load_video_to_numpy
+from dataset.neuropixel import dataset_details, load_data, load_video_to_numpy, shared_data
+from dataset.video_store import load_videos
+from dataset.features import load_features, register_feature
+from dataset.indexes import get_data_index
+from dataset.stats import repeat_tensor, split_half_reliability, noise_ceiling, noise_correlations
+from utils.results_utils import open_results_store
 
 from utils.string_utils import *
 from utils.history_utils import *
 from utils.code_utils import *
 
-# put data in globals to help with running llm generated code that assumes this exists 
-exec("data = load_data()", globals()) # hacky
+# put data in globals to help with running llm generated code that assumes this exists;
+# it is only loaded when the code first uses it, so importing this module stays fast
+data = shared_data
+
+# generated code shares this module's globals (and matplotlib state), so only one snippet runs at a time
+exec_lock = threading.Lock()
+
+# where record_result saves results, and the node whose code is running (set by exec_and_get_error)
+result_context = {"results_path": None, "node": None, "task_prompt": None}
+
+def record_result(text, kind="result"):
+   """
+   Save a numeric/statistical result so that later tasks can find it. Generated code calls this.
+   Input: text (str) - the result, with enough context to be understood on its own
+   """
+   if result_context["results_path"] is None:
+      with open("./results.txt", "a") as file: # no results store configured
+         file.write(str(text) + "\n")
+      return
+   open_results_store(result_context["results_path"]).add(text, node=result_context["node"],
+                                                          task_prompt=result_context["task_prompt"], kind=kind)
 
 # code debugging and execution utils
-def exec_and_get_error(code):
-   try:
-      exec(code, globals())
-      return True, ""
-   except Exception as e:
-      tb = traceback.format_exc()
-      return False, tb
\ No newline at end of file
+def exec_and_get_error(code, context=None):
+   """
+   Run code in this module's globals. context optionally sets result_context (results_path, node,
+   task_prompt) for the duration of the run, so record_result attributes results to the right node.
+   """
+   with exec_lock:
+      saved = dict(result_context)
+      if context is not None:
+         result_context.update(context)
+      try:
+         exec(code, globals())
+         return True, ""
+      except Exception as e:
+         tb = traceback.format_exc()
+         return False, tb
+      finally:
+         result_context.update(saved)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import os
+import time
+import queue
+import hashlib
+import threading
+import multiprocessing
+
+from utils.string_utils import parse_definitions
+
+def _worker_main(conn):
+    # the forkserver has already imported code_utils and loaded the data (utils.exec_preload), so this is just a lookup
+    from utils import exec_preload
+    try:
+        import utils.code_utils as code_utils
+    except Exception:
+        code_utils = None
+    preload_error = f"\n\nThe execution worker could not preload the dataset:\n{exec_preload.error}" if exec_preload.error else ""
+
+    seen = set()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        definitions, code, context = message
+        if code_utils is None:
+            conn.send((False, "RuntimeError: the execution worker could not import utils.code_utils." + preload_error))
+            continue
+
+        # bring this worker's globals up to date with the imports and functions other workers have run
+        for key, source in definitions:
+            if key not in seen:
+                code_utils.exec_and_get_error(source)
+                seen.add(key)
+        status, output = code_utils.exec_and_get_error(code, context)
+        conn.send((status, output if status else output + preload_error))
+    conn.close()
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+class ExecPool:
+    """
+    Pool of warm worker processes that execute LLM-generated code outside the main process.
+
+    Workers are forked from a forkserver that has preloaded utils.code_utils and the data, so numpy and the dataset
+    are loaded once and shared copy-on-write. Each snippet runs with a wall-clock timeout and an RSS limit;
+    a worker that exceeds either is killed and replaced. run() returns (status, traceback) just like
+    code_utils.exec_and_get_error. The top-level imports and function/class definitions of snippets that ran
+    successfully are replayed into every worker before its next job, in the order they first ran, so later
+    code can keep calling those functions whichever worker it lands on.
+    """
+    def __init__(self, n_workers=4, timeout=600, max_rss_mb=16384, poll_interval=0.1):
+        self.n_workers = n_workers
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.poll_interval = poll_interval
+
+        self.ctx = multiprocessing.get_context("forkserver")
+        self.ctx.set_forkserver_preload(["utils.exec_preload"])
+
+        self.lock = threading.Lock()
+        self.definitions = {} # hash of definition source -> source, in the order they first ran
+        self.idle = queue.Queue()
+        self.workers = []
+        for _ in range(n_workers):
+            self.idle.put(self.spawn())
+
+    def spawn(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        worker = (process, parent_conn)
+        with self.lock:
+            self.workers.append(worker)
+        return worker
+
+    def replace(self, worker):
+        process, conn = worker
+        process.kill()
+        process.join()
+        conn.close()
+        with self.lock:
+            self.workers.remove(worker)
+        return self.spawn()
+
+    def run(self, code, context=None):
+        worker = self.idle.get()
+        process, conn = worker
+        with self.lock:
+            definitions = list(self.definitions.items())
+        try:
+            conn.send((definitions, code, context))
+            start = time.monotonic()
+            while not conn.poll(self.poll_interval):
+                if not process.is_alive():
+                    raise EOFError
+                if time.monotonic() - start > self.timeout:
+                    worker = self.replace(worker)
+                    return False, f"TimeoutError: code execution exceeded the {self.timeout}s wall-clock limit and was stopped."
+                if self.max_rss_mb is not None and _rss_mb(process.pid) > self.max_rss_mb:
+                    worker = self.replace(worker)
+                    return False, f"MemoryError: code execution exceeded the {self.max_rss_mb} MB memory limit and was stopped."
+            status, output = conn.recv()
+        except (EOFError, OSError):
+            process.join(timeout=1)
+            exitcode = process.exitcode
+            worker = self.replace(worker)
+            return False, f"RuntimeError: the process executing the code died unexpectedly (exit code {exitcode})."
+        finally:
+            self.idle.put(worker)
+
+        if status:
+            self.add_definitions(code)
+        return status, output
+
+    def add_definitions(self, code):
+        try:
+            definitions = parse_definitions(code)
+        except SyntaxError:
+            return
+        with self.lock:
+            for source in definitions:
+                self.definitions.setdefault(hashlib.sha1(source.encode("utf-8")).hexdigest(), source)
+
+    def close(self):
+        with self.lock:
+            workers = list(self.workers)
+            self.workers = []
+        for process, conn in workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(timeout=1)
+            if process.is_alive():
+                process.kill()
+            conn.close()
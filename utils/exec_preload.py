@@ -0,0 +1,18 @@
+# imported by the ExecPool forkserver: loads the dataset once so every worker inherits it copy-on-write
+import traceback
+
+# a failed preload must not kill the forkserver (every worker would then die with a bare EOFError);
+# the traceback is kept and the workers report it instead
+error = None
+try:
+    import utils.code_utils as code_utils
+    code_utils.data.load()
+except Exception:
+    error = traceback.format_exc()
+
+# the main process imports cv2 only when it decodes a video; the workers run generated code that often does,
+# so they get it preloaded instead of each importing it cold
+try:
+    import cv2
+except ImportError:
+    pass
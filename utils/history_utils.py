@@ -10,40 +10,150 @@ from utils.string_utils import *
 from utils.history_utils import *
 from utils.code_utils import *
 
-# put all of our code, idea, dataset, results history information together into a prompt 
-def get_current_history(idea_list, dataset_info, comment_list, include_ideas=True, include_dataset=True, include_code=True, include_results=True):
-    prompt = ""
+import os
+import threading
 
-    if include_ideas:
-        try:
-            if len(idea_list) > 0:
-                prompt += "You have already brainstormed the following ideas:\n"
-                prompt += "\n".join(idea_list)
-        except: 
-            pass
-    if include_results:
-        try: 
-            with open("./results.txt", 'r', encoding='utf-8') as file:
-                file_str = file.read()
-    
-            if len(file_str) > 10: 
-                prompt += "\nYou have already identified the following results with the dataset: " + file_str
-        except:
-            pass
-
-    if include_dataset:
-        prompt += "\nDataset Information: " + dataset_info
-        
-    if include_code:
+class HistoryBuilder:
+    """
+    Builds the history prompt (ideas, results, dataset information, function catalogue) for the nodes
+    that share one idea_list and comment_list.
+
+    Each section is rendered once and cached. The idea and comment lists only ever grow, so new entries
+    are appended to the cached text instead of re-joining everything, and results.txt is only re-read
+    when its modification time or size changes. Composed prompts are cached per combination of sections.
+
+    With a results_store (utils.results_utils.ResultsStore) the results section instead lists only the
+    results_k results most relevant to the query passed to render (the node's task prompt).
+    """
+    def __init__(self, idea_list, dataset_info, comment_list, results_path="./results.txt", registry=None,
+                 results_store=None, results_k=5, max_result_chars=2000):
+        self.idea_list = idea_list
+        self.dataset_info = dataset_info
+        self.comment_list = comment_list
+        self.results_path = results_path
+        self.registry = registry # utils.registry_utils.FunctionRegistry, used for a compact deduplicated catalogue
+        self.results_store = results_store
+        self.results_k = results_k
+        self.max_result_chars = max_result_chars
+
+        self.lock = threading.Lock()
+        self.n_ideas, self.idea_text = 0, ""
+        self.n_comments, self.code_text = 0, ""
+        self.code_version = None
+        self.results_key, self.results_text = None, ""
+        self.composed = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def ideas_section(self):
+        n_ideas = len(self.idea_list)
+        if n_ideas < self.n_ideas:
+            self.n_ideas, self.idea_text = 0, ""  # the list was replaced, start over
+        if n_ideas > self.n_ideas:
+            new_text = "\n".join(str(idea) for idea in self.idea_list[self.n_ideas:n_ideas])
+            self.idea_text = new_text if self.n_ideas == 0 else self.idea_text + "\n" + new_text
+            self.n_ideas = n_ideas
+        if n_ideas == 0:
+            return ""
+        return "You have already brainstormed the following ideas:\n" + self.idea_text
+
+    def results_section(self, query=None):
+        if self.results_store is not None:
+            return self.store_results_section(query)
         try:
-            if len(comment_list) > 0:
-                prompt = "\nYou have already written the following functions, feel free to use them:\n"
-                for comment in comment_list:
-                    try:
-                        prompt += comment['name'] + "\n" + comment['docstring'] + "\n\n"
-                    except:
-                        pass
-        except: 
-            pass
-
-    return prompt
\ No newline at end of file
+            stat = os.stat(self.results_path)
+            results_key = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            results_key = None
+        if results_key != self.results_key:
+            self.results_key, self.results_text = results_key, ""
+            if results_key is not None:
+                try:
+                    with open(self.results_path, 'r', encoding='utf-8') as file:
+                        file_str = file.read()
+                    if len(file_str) > 10:
+                        self.results_text = "\nYou have already identified the following results with the dataset: " + file_str
+                except (OSError, UnicodeDecodeError):
+                    pass
+        return self.results_text
+
+    def store_results_section(self, query):
+        results_key = (self.results_store.version(), query)
+        if results_key != self.results_key:
+            self.results_key, self.results_text = results_key, ""
+            entries = []
+            for result in self.results_store.top_k(query, k=self.results_k):
+                content = result["content"].strip()
+                if len(content) > self.max_result_chars:
+                    content = content[:self.max_result_chars] + "..."
+                source = f" (task {'.'.join(str(i) for i in result['node'])})" if result["node"] else ""
+                entries.append(f"- {content}{source}")
+            if entries:
+                self.results_text = "\nYou have already identified the following results with the dataset:\n" + "\n".join(entries)
+        return self.results_text
+
+    def code_section(self):
+        if self.registry is not None:
+            if self.registry.version != self.code_version:
+                self.code_version = self.registry.version
+                self.code_text = self.registry.catalogue()
+            if not self.code_text:
+                return ""
+            return "\nYou have already written the following functions, feel free to use them:\n" + self.code_text
+
+        n_comments = len(self.comment_list)
+        if n_comments < self.n_comments:
+            self.n_comments, self.code_text = 0, ""
+        for comment in self.comment_list[self.n_comments:n_comments]:
+            try:
+                self.code_text += comment['name'] + "\n" + comment['docstring'] + "\n\n"
+            except (KeyError, TypeError):
+                pass
+        self.n_comments = self.code_version = n_comments
+        if n_comments == 0:
+            return ""
+        return "\nYou have already written the following functions, feel free to use them:\n" + self.code_text
+
+    def render(self, include_ideas=True, include_dataset=True, include_code=True, include_results=True, query=None):
+        with self.lock:
+            ideas = self.ideas_section() if include_ideas else ""
+            results = self.results_section(query) if include_results else ""
+            code = self.code_section() if include_code else ""
+
+            key = (include_ideas, include_dataset, include_code, include_results)
+            versions = (self.n_ideas, self.results_key, self.code_version)
+            cached = self.composed.get(key)
+            if cached is not None and cached[0] == versions:
+                return cached[1]
+
+            prompt = ideas + results
+            if include_dataset:
+                prompt += "\nDataset Information: " + self.dataset_info
+            prompt += code
+            self.composed[key] = (versions, prompt)
+            return prompt
+
+    def render_split(self, include_ideas=True, include_dataset=True, include_code=True, include_results=True, query=None):
+        """
+        Like render, but returns (stable, variable): the dataset information and function catalogue, which are
+        shared by every node in the tree, and the ideas and results, which differ between levels and change often.
+        Putting the stable part first lets the server reuse its cached prefill across nodes.
+        """
+        with self.lock:
+            stable = ("Dataset Information: " + self.dataset_info) if include_dataset else ""
+            if include_code:
+                stable += self.code_section()
+            variable = (self.ideas_section() if include_ideas else "") + (self.results_section(query) if include_results else "")
+            return stable.strip("\n"), variable.strip("\n")
+
+# put all of our code, idea, dataset, results history information together into a prompt 
+def get_current_history(idea_list, dataset_info, comment_list, include_ideas=True, include_dataset=True, include_code=True, include_results=True):
+    return HistoryBuilder(idea_list, dataset_info, comment_list).render(include_ideas=include_ideas, include_dataset=include_dataset,
+                                                                        include_code=include_code, include_results=include_results)
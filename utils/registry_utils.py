@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+
+from utils.response_utils import analyze_code
+
+class FunctionRegistry:
+    """
+    Deduplicated store of the functions written by the agent, shared by the whole Task tree.
+
+    Functions are keyed on a normalized AST hash, so a helper that is re-written with different formatting,
+    comments or docstring is stored (and logged to code_log.py) only once. Snippets that already ran
+    successfully are remembered by the same kind of hash, so identical code need not be executed again.
+    catalogue() renders a compact listing (signature and condensed docstring) for the history prompt,
+    keeping only the latest definition of each function name.
+    """
+    def __init__(self, log_path="./logs/code_log.py", max_doc_chars=300):
+        self.log_path = log_path
+        self.max_doc_chars = max_doc_chars
+        self.lock = threading.Lock()
+        self.functions = OrderedDict() # hash -> {"name", "signature", "source", "comment"}
+        self.succeeded = {} # normalized hash of a snippet that ran successfully -> its output
+        self.version = 0 # bumped whenever the catalogue changes
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def successful_output(self, code):
+        """
+        Output of an earlier successful run of equivalent code, or None.
+        """
+        try:
+            key = analyze_code(code).hash
+        except SyntaxError:
+            return None
+        with self.lock:
+            return self.succeeded.get(key)
+
+    def mark_succeeded(self, code, output):
+        try:
+            key = analyze_code(code).hash
+        except SyntaxError:
+            return
+        with self.lock:
+            self.succeeded[key] = output
+
+    def register(self, code):
+        """
+        Add the functions defined in code. Returns parse_comments-style entries for the functions that
+        were not already registered.
+        """
+        analysis = analyze_code(code)
+        comments = {comment["name"]: comment for comment in analysis.comments()}
+        new_comments = []
+        with self.lock:
+            for function in analysis.functions:
+                key = function["hash"]
+                if key in self.functions:
+                    continue
+                self.functions[key] = {"name": function["name"],
+                                       "signature": function["signature"],
+                                       "source": function["source"],
+                                       "comment": comments.get(function["name"])}
+                if comments.get(function["name"]) is not None:
+                    new_comments.append(comments[function["name"]])
+                if self.log_path is not None:
+                    with open(self.log_path, "a") as file:
+                        file.write("\n\n\n")
+                        file.write(function["source"])
+                self.version += 1
+        return new_comments
+
+    def catalogue(self):
+        with self.lock:
+            latest = OrderedDict()
+            for entry in self.functions.values():
+                latest.pop(entry["name"], None)
+                latest[entry["name"]] = entry
+        lines = []
+        for entry in latest.values():
+            docstring = (entry["comment"] or {}).get("docstring") or ""
+            docstring = " ".join(docstring.split())
+            if len(docstring) > self.max_doc_chars:
+                docstring = docstring[:self.max_doc_chars] + "..."
+            lines.append(entry["signature"] + (": " + docstring if docstring else ""))
+        return "\n".join(lines)
+
+    def state(self):
+        with self.lock:
+            return {"functions": list(self.functions.items()), "succeeded": dict(self.succeeded)}
+
+    def load_state(self, state):
+        with self.lock:
+            self.functions = OrderedDict((key, entry) for key, entry in state["functions"])
+            self.succeeded = dict(state["succeeded"])
+            self.version += 1
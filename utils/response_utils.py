@@ -0,0 +1,205 @@
+import re
+import ast
+import json
+import hashlib
+import textwrap
+from functools import lru_cache, cached_property
+
+# compiled once; the parsers in utils.string_utils are thin wrappers around this module
+THINK_PATTERN = re.compile(r'<think>.*?</think>', re.DOTALL)
+SELECTION_PATTERN = re.compile(r'\*\*[^\d]*(\d+)[^\d]*\*\*')
+CODE_PATTERN = re.compile(r"```(.*?)```", re.DOTALL)
+JSON_PATTERN = re.compile(r'```json\n(.*?)\n```', re.DOTALL)
+MAIN_GUARD_PATTERN = re.compile(r'if __name__ == "__main__":\n(.*)', re.DOTALL)
+
+_INPUT_PREFIXES = ("input", "arg", "parameter")
+_OUTPUT_PREFIXES = ("output", "return")
+
+def strip_think(text):
+    """
+    Remove <think>...</think> blocks from a model response.
+    """
+    if "<think>" not in text:
+        return text
+    return THINK_PATTERN.sub('', text)
+
+def remove_main_guard(code):
+    match = MAIN_GUARD_PATTERN.search(code)
+    if match:
+        # the guard runs to the end of the code, so the dedented block simply replaces it
+        code = code[:match.start()] + textwrap.dedent(match.group(1))
+    return code.strip()
+
+def split_docstring(docstring):
+    """
+    Split a docstring into description, input and output sections, keyed on lines starting with
+    input/arg/parameter and output/return.
+    """
+    sections = {"description": [], "input": [], "output": []}
+    phase = "description"
+    for line in docstring.split("\n"):
+        start = line.strip().lower()
+        if start.startswith(_INPUT_PREFIXES):
+            phase = "input"
+        elif start.startswith(_OUTPUT_PREFIXES):
+            phase = "output"
+        sections[phase].append(line + "\n")
+    return {key: "".join(lines) for key, lines in sections.items()}
+
+class _StripDocstrings(ast.NodeTransformer):
+    def strip(self, node):
+        self.generic_visit(node)
+        body = node.body
+        if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+                and isinstance(body[0].value.value, str):
+            node.body = body[1:] or [ast.Pass()]
+        return node
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_Module = strip
+
+def _dump_hash(tree):
+    return hashlib.sha1(ast.dump(tree, annotate_fields=False, include_attributes=False).encode("utf-8")).hexdigest()
+
+def normalized_hash(tree):
+    """
+    Hash of an AST (or source string) that ignores formatting, comments and docstrings.
+    Docstrings are stripped in place, so pass a tree that is not needed afterwards.
+    """
+    if isinstance(tree, str):
+        tree = ast.parse(tree)
+    return _dump_hash(_StripDocstrings().visit(tree))
+
+def _names(node, context):
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name) and isinstance(child.ctx, context)}
+
+def _definition_statements(body):
+    # top-level imports and definitions, plus the assignments the definitions need, in source order
+    definition_types = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+    needed = set()
+    for node in body:
+        if isinstance(node, definition_types):
+            needed |= _names(node, ast.Load)
+    keep = set()
+    # backwards, so the names an assignment needs pull in the earlier assignments that provide them
+    for i in reversed(range(len(body))):
+        node = body[i]
+        if isinstance(node, (ast.Import, ast.ImportFrom) + definition_types):
+            keep.add(i)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)) and _names(node, ast.Store) & needed:
+            keep.add(i)
+            needed |= _names(node, ast.Load)
+    return [body[i] for i in sorted(keep)]
+
+class CodeAnalysis:
+    """
+    Everything the agent needs from one block of Python code, from a single ast.parse.
+
+    functions lists the (possibly nested) function definitions in ast.walk order, each a dict with name,
+    signature, source (exact lineno..end_lineno range), docstring, description/input/output sections and
+    the normalized hash of the definition. definitions lists, in the order they appear, the sources of the
+    top-level imports, function/class definitions and the module-level assignments those definitions
+    reference (directly or through other such assignments), i.e. what another interpreter needs to call
+    the block's functions without running the rest of it. hash is the normalized hash of the whole block.
+    """
+    __slots__ = ("code", "functions", "definitions", "hash")
+
+    def __init__(self, code):
+        self.code = code
+        tree = ast.parse(code)
+        lines = code.split("\n")
+        nodes = [node for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        self.functions = []
+        for node in nodes:
+            docstring = ast.get_docstring(node)
+            function = {"name": node.name,
+                        "signature": f"{node.name}({ast.unparse(node.args)})",
+                        "source": "\n".join(lines[node.lineno - 1:node.end_lineno]),
+                        "lineno": node.lineno,
+                        "end_lineno": node.end_lineno,
+                        "docstring": docstring,
+                        "is_async": isinstance(node, ast.AsyncFunctionDef)}
+            function.update(split_docstring(docstring) if docstring else {"description": "", "input": "", "output": ""})
+            self.functions.append(function)
+        self.definitions = [self.statement_source(node, lines) for node in _definition_statements(tree.body)]
+        # hashing strips docstrings in place, so it runs only after everything above has been read;
+        # stripping is idempotent, so hashing an outer definition after an inner one is unaffected
+        for function, node in zip(self.functions, nodes):
+            function["hash"] = _dump_hash(_StripDocstrings().visit(ast.Module(body=[node], type_ignores=[])))
+        self.hash = _dump_hash(_StripDocstrings().visit(tree))
+
+    def statement_source(self, node, lines):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            return "\n".join(lines[start - 1:node.end_lineno])
+        return ast.get_source_segment(self.code, node) # exact, the statement may share a line
+
+    def comments(self):
+        # same entries as utils.string_utils.parse_comments
+        return [{"name": f["name"], "description": f["description"], "input": f["input"],
+                 "output": f["output"], "docstring": f["docstring"]}
+                for f in self.functions if not f["is_async"]]
+
+    def function_sources(self):
+        # same mapping as utils.string_utils.parse_functions
+        return {f["name"]: f["source"] for f in self.functions if not f["is_async"]}
+
+@lru_cache(maxsize=256)
+def analyze_code(code):
+    """
+    Cached CodeAnalysis of code. The same block is typically parsed for comments, for the function log,
+    for the registry and by the execution pool, this makes all of them share one ast.parse.
+    Raises SyntaxError like ast.parse. Treat the result as read-only.
+    """
+    return CodeAnalysis(code)
+
+class ResponseAnalysis:
+    """
+    Structured view of one LLM response. The <think> block is removed once up front; the selection, the
+    first code block and the json block are each located with one compiled search the first time they
+    are asked for, so a parser only pays for the part of the response it needs.
+    """
+    def __init__(self, response):
+        self.text = strip_think(response)
+
+    @cached_property
+    def selection(self):
+        # integer enclosed in double asterisks, -1 if there is none
+        match = SELECTION_PATTERN.search(self.text)
+        return int(match.group(1)) if match else -1
+
+    @cached_property
+    def code(self):
+        # first fenced block without its language tag line and main guard, None if there is none
+        match = CODE_PATTERN.search(self.text)
+        if not match:
+            return None
+        section = match.group(1)
+        lines = section.splitlines()
+        # drop the language tag line, unless the code starts right after the fence
+        if lines and lines[0].find('import') == -1:
+            section = '\n'.join(lines[1:])
+        return remove_main_guard(section)
+
+    @cached_property
+    def json(self):
+        # parsed ```json block, None if there is none or it does not parse
+        match = JSON_PATTERN.search(self.text)
+        if not match:
+            return None
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            return None
+
+    @cached_property
+    def code_analysis(self):
+        # analysis of the code block, None when there is no code block or it does not parse
+        if not self.code:
+            return None
+        try:
+            return analyze_code(self.code)
+        except SyntaxError:
+            return None
+
+def analyze_response(response):
+    return ResponseAnalysis(response)
@@ -0,0 +1,138 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+
+class ResultsStore:
+    """
+    Results found during a run, in a single SQLite file shared by every node and execution worker.
+
+    The database is in WAL mode, so any number of threads and processes can append concurrently
+    (each thread and process uses its own connection, and writers wait up to busy_timeout seconds for
+    the write lock). Every result records the path of the node that produced it and that node's task.
+    An FTS5 index over the text lets top_k() return only the results relevant to a task prompt, ranked
+    by bm25, instead of pasting every result into every prompt. Without FTS5 the most recent results
+    are returned.
+    """
+    def __init__(self, path="./logs/results.sqlite", busy_timeout=30.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
+        self.local = threading.local()
+
+        conn = self.connection()
+        conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            node TEXT,
+                            task_prompt TEXT,
+                            kind TEXT NOT NULL,
+                            content TEXT NOT NULL,
+                            created REAL NOT NULL)""")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(content, task_prompt, content='results', content_rowid='id')")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS results_fts_insert AFTER INSERT ON results BEGIN
+                                INSERT INTO results_fts(rowid, content, task_prompt) VALUES (new.id, new.content, new.task_prompt);
+                            END""")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False # sqlite built without FTS5
+        conn.commit()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or getattr(self.local, "pid", None) != os.getpid():
+            # connections must not be shared across threads or inherited by forked processes
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def __getstate__(self):
+        return {"path": self.path, "busy_timeout": self.busy_timeout, "fts": self.fts}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.local = threading.local()
+
+    def add(self, content, node=None, task_prompt=None, kind="result"):
+        """
+        Append a result. node is the path of the producing Task (a tuple/list of sibling indices).
+        Returns the id of the new row.
+        """
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute("INSERT INTO results (node, task_prompt, kind, content, created) VALUES (?, ?, ?, ?, ?)",
+                                  (json.dumps(list(node)) if node is not None else None, task_prompt, kind, str(content), time.time()))
+        return cursor.lastrowid
+
+    def version(self):
+        # id of the newest result, changes whenever a result is added
+        row = self.connection().execute("SELECT MAX(id) FROM results").fetchone()
+        return row[0] or 0
+
+    def count(self):
+        return self.connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def rows(self, query, params=()):
+        return [{"id": row[0], "node": json.loads(row[1]) if row[1] else None, "task_prompt": row[2],
+                 "kind": row[3], "content": row[4], "created": row[5]}
+                for row in self.connection().execute(query, params)]
+
+    def top_k(self, query=None, k=5, kinds=None):
+        """
+        Return up to k results most relevant to query (e.g. a task prompt), best first. Without a
+        query, or when nothing matches, the k most recent results are returned.
+        """
+        kind_filter, kind_params = "", ()
+        if kinds is not None:
+            kinds = list(kinds)
+            kind_filter = " AND r.kind IN (" + ",".join("?" * len(kinds)) + ")"
+            kind_params = tuple(kinds)
+        if query and self.fts:
+            # any of the words, ranked by bm25; quoting keeps FTS5 operators in the prompt from being parsed
+            terms = " OR ".join('"' + word + '"' for word in dict.fromkeys(_WORD.findall(query.lower())))
+            if terms:
+                found = self.rows("SELECT r.id, r.node, r.task_prompt, r.kind, r.content, r.created FROM results_fts "
+                                  "JOIN results r ON r.id = results_fts.rowid WHERE results_fts MATCH ?" + kind_filter +
+                                  " ORDER BY bm25(results_fts) LIMIT ?", (terms,) + kind_params + (k,))
+                if found:
+                    return found
+        return self.rows("SELECT r.id, r.node, r.task_prompt, r.kind, r.content, r.created FROM results r WHERE 1" + kind_filter +
+                         " ORDER BY r.id DESC LIMIT ?", kind_params + (k,))
+
+    def for_node(self, node):
+        return self.rows("SELECT id, node, task_prompt, kind, content, created FROM results WHERE node = ? ORDER BY id",
+                         (json.dumps(list(node)),))
+
+    def import_file(self, path, kind="legacy"):
+        """
+        Add the contents of a results text file (such as an old ./results.txt) as one result.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                content = file.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        return self.add(content, kind=kind) if content.strip() else None
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+# results stores opened in this process, by path (used by execution workers)
+_stores = {}
+_stores_lock = threading.Lock()
+
+def open_results_store(path):
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ResultsStore(path)
+        return store
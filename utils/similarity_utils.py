@@ -0,0 +1,121 @@
+import re
+import zlib
+import threading
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PRIME = (1 << 31) - 1 # a * x + b stays below 2**63 for a, b, x < _PRIME
+
+# words that carry no meaning about what a task does
+stop_words = frozenset("a an the of and or to in on for with by from as at is are be this that these those it its "
+                       "each all any their which using use into over per than then".split())
+
+def shingles(text, size=2):
+    """
+    Set of hashed word n-grams of a normalized text (lowercase, punctuation and stop words removed).
+    Texts shorter than size words give a single shingle of all their words.
+    """
+    words = [word for word in _WORD.findall(text.lower()) if word not in stop_words]
+    grams = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams if gram}
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index of task prompts for finding near-duplicate subtasks, shared by the whole tree.
+
+    Each prompt is reduced to word shingles and a num_perm MinHash signature. LSH over bands of the
+    signature finds candidate matches in roughly constant time, and a candidate is a duplicate when the
+    estimated Jaccard similarity of the shingle sets is at least threshold.
+
+    Reuses and merges are recorded in events for report().
+    """
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, shingle_size=2, seed=0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+        self.lock = threading.Lock()
+        self.signatures = [] # signature of every indexed prompt
+        self.nodes = [] # the node indexed with each signature
+        self.buckets = [{} for _ in range(bands)] # band -> hash of band -> indices
+        self.events = [] # (kind, prompt, matched node) for every reuse or merge
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def signature(self, text):
+        values = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64) % np.uint64(_PRIME)
+        if values.size == 0:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        # (a * x + b) mod p for every permutation (rows) and shingle (columns)
+        hashed = (self.a[:, None] * values[None, :] + self.b[:, None]) % np.uint64(_PRIME)
+        return hashed.min(axis=1)
+
+    def similarity(self, sig1, sig2):
+        return float(np.mean(sig1 == sig2))
+
+    def band_keys(self, sig):
+        return [hash(sig[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+    def find(self, text, exclude=()):
+        """
+        Return (node, similarity, signature) for the most similar indexed prompt at or above threshold,
+        ignoring nodes in exclude (e.g. the node's ancestors); node is None if there is none.
+        The signature can be passed to add().
+        """
+        sig = self.signature(text)
+        keys = self.band_keys(sig)
+        with self.lock:
+            candidates = set()
+            for bucket, key in zip(self.buckets, keys):
+                candidates.update(bucket.get(key, ()))
+            best, best_score = None, 0.0
+            for i in sorted(candidates, reverse=True): # most recent first, so ties go to siblings
+                if any(self.nodes[i] is other for other in exclude):
+                    continue
+                score = self.similarity(sig, self.signatures[i])
+                if score > best_score:
+                    best, best_score = self.nodes[i], score
+        if best_score < self.threshold:
+            best = None
+        return best, best_score, sig
+
+    def add(self, node, sig):
+        keys = self.band_keys(sig)
+        with self.lock:
+            index = len(self.nodes)
+            self.signatures.append(sig)
+            self.nodes.append(node)
+            for bucket, key in zip(self.buckets, keys):
+                bucket.setdefault(key, []).append(index)
+
+    def record(self, kind, prompt, matched):
+        with self.lock:
+            self.events.append((kind, prompt, matched))
+
+    def report(self, cost=None):
+        """
+        Counts of merged and reused subtasks. With cost (a function of the matched node returning the
+        seconds of LLM time it took), also the LLM time the skipped duplicates would have spent.
+        """
+        with self.lock:
+            events = list(self.events)
+            report = {"indexed": len(self.nodes),
+                      "merged": sum(kind == "merge" for kind, _, _ in events),
+                      "reused": sum(kind == "reuse" for kind, _, _ in events)}
+        if cost is not None:
+            report["llm_time_saved"] = sum(cost(matched) for _, _, matched in events)
+        return report
@@ -10,20 +10,11 @@ from utils.string_utils import *
 from utils.history_utils import *
 from utils.code_utils import *
 
-import textwrap
-import re
 
-def remove_main_guard(code: str) -> str:
-    pattern = r'if __name__ == "__main__":\n(.*)'  # Match the main guard
-    match = re.search(pattern, code, re.DOTALL)
-    
-    if match:
-        indented_block = match.group(1)
-        unindented_block = textwrap.dedent(indented_block)
-        code = re.sub(pattern, unindented_block, code, flags=re.DOTALL)
-    
-    return code.strip()
-    
+from utils.response_utils import analyze_code, analyze_response, remove_main_guard
+
+# the parsers below keep their original interfaces; the work is done once per response / code block
+# in utils.response_utils
 def parse_comments(code: str) -> List[Dict[str, str]]:
     """
     Parse a string containing Python code and extract function names, input variable comments,
@@ -38,75 +29,14 @@ def parse_comments(code: str) -> List[Dict[str, str]]:
             - "inputs": A string describing the input variables (extracted from comments).
             - "output": A string describing the output (extracted from comments).
     """
-    # Parse the code into an AST
-    tree = ast.parse(code)
-
-    # Initialize a list to store function metadata
-    functions = []
-
-    # Iterate through the AST nodes
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # Extract the function name
-            function_name = node.name
-
-            # Extract the function's docstring (if any)
-            docstring = ast.get_docstring(node)
-
-            # Initialize input and output descriptions
-            description = ''
-            inputs = ''
-            outputs = ''
-
-            # Parse the docstring for input and output descriptions
-            if docstring:
-                lines = docstring.split("\n")
-                phase = 'description'
-
-                for line in lines:
-                    if line.strip().lower().startswith("input"):
-                        phase = 'input'
-                    elif line.strip().lower().startswith("arg"):
-                        phase = 'input'
-                    elif line.strip().lower().startswith("parameter"):
-                        phase = 'input'
-                    elif line.strip().lower().startswith("output"):
-                        phase = 'output'
-                    elif line.strip().lower().startswith("return"):
-                        phase = 'output'
-                        
-                    if phase == 'description':
-                        description += line + "\n"
-                    elif phase == 'input':
-                        inputs += line+ "\n"
-                    elif phase == 'output':
-                        outputs += line+ "\n"
-
-            # Add the function metadata to the list
-            functions.append({
-                "name": function_name,
-                "description": description,
-                "input": inputs,
-                "output": outputs,
-                "docstring": docstring
-            })
-            
-    return functions
+    return analyze_code(code).comments()
 
 def parse_functions(code):
-    tree = ast.parse(code)
-    functions = {}
-    
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            func_name = node.name
-            func_start = node.lineno - 1
-            func_end = max(n.lineno for n in ast.walk(node) if hasattr(n, 'lineno'))
-            
-            func_lines = code.split('\n')[func_start:func_end]
-            functions[func_name] = '\n'.join(func_lines)
-    
-    return functions
+    return analyze_code(code).function_sources()
+
+def parse_definitions(code):
+    # top-level imports, function/class definitions and the assignments they reference, in order
+    return list(analyze_code(code).definitions)
     
 # string processing utils
 def parse_action_selection(s):
@@ -116,16 +46,13 @@ def parse_action_selection(s):
     Input: s (str) - The input string potentially containing **integer** patterns.
     Output: int - The extracted integer or -1 if no valid number is found.
     """
-    match = re.search(r'\*\*[^\d]*(\d+)[^\d]*\*\*', s)
-    if match:
-        return int(match.group(1))
-    return -1  
+    return analyze_response(s).selection
     
 def parse_action_code(input_string):
-  section = re.search(r"```(.*?)```", input_string, re.DOTALL).group(1) if re.search(r"```(.*?)```", input_string, re.DOTALL) else None
-  output_string = '\n'.join(lines[1:]) if (lines := section.splitlines())[0].find('import') == -1 else section
-  output_string =  remove_main_guard(output_string)
-  return output_string
+    code = analyze_response(input_string).code
+    if code is None:
+        raise ValueError("no code block found in the response")
+    return code
 
 def parse_json(text):
     """
@@ -134,21 +61,7 @@ def parse_json(text):
     Input: text (str) - The full text output from the LLM, including embedded JSON.
     Output: list[dict] - A list of dictionaries extracted from the 'subtasks' field in the JSON.
     """
-    try:
-        # Extract the JSON portion enclosed in triple backticks
-        match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL)
-        if not match:
-            #print("Error: No JSON found in text.")
-            return None
-        
-        json_str = match.group(1)  # Extract JSON content
-        json_data = json.loads(json_str)  # Parse JSON
-        
-        # Extract 'subtasks' list if present
-        return json_data
-    except json.JSONDecodeError:
-        #print("Error: Failed to parse JSON.")
-        return None
+    return analyze_response(text).json
 
 def parse_action_divide(text):
     return parse_json(text)
@@ -158,3 +71,42 @@ def parse_action_brainstorm(text):
 
 def combine_prompts(prompt_list):
     return "\n\n".join(prompt_list)
+
+# incremental parsing of streamed responses
+class StreamParser:
+    """
+    Wraps one of the parsers above so it can be applied to a growing response.
+
+    The parser only runs when the terminator (e.g. the closing ** or ```) appears in newly streamed text,
+    so parsing cost stays proportional to the number of candidate answers rather than tokens.
+    feed() returns the parsed answer once one is complete and valid, otherwise None.
+    """
+    def __init__(self, parse, terminator, is_valid=lambda result: result is not None):
+        self.parse = parse
+        self.terminator = terminator
+        self.is_valid = is_valid
+        self.checked = 0
+        self.result = None
+
+    def feed(self, text):
+        start = max(self.checked - len(self.terminator) + 1, 0)
+        self.checked = len(text)
+        if text.find(self.terminator, start) == -1:
+            return None
+        try:
+            result = self.parse(text)
+        except Exception:
+            return None
+        if self.is_valid(result):
+            self.result = result
+            return result
+        return None
+
+def selection_stream_parser(n_actions):
+    return StreamParser(parse_action_selection, "**", is_valid=lambda result: 1 <= result <= n_actions)
+
+def json_stream_parser():
+    return StreamParser(parse_json, "```")
+
+def code_stream_parser():
+    return StreamParser(parse_action_code, "```", is_valid=lambda result: result is not None and len(result) > 0)
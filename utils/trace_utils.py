@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Tracer:
+    """
+    Records timed spans (name, duration, parent, attributes) for an agent run.
+
+    Spans nest through a context variable, so parent links are correct across threads and asyncio tasks.
+    Node attributes (level, path, action) are inherited from the enclosing span, so e.g. an LLM call is
+    attributed to the node and action that made it. Finished spans are appended to a JSONL file as they
+    complete; save_chrome_trace writes the same spans in Chrome trace format (chrome://tracing, Perfetto).
+    Tracing is off until enable() is called, and span() is then nearly free.
+    """
+    inherited = ("level", "path", "action")
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.spans = []
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.origin = time.perf_counter()
+
+    def enable(self, path=None):
+        self.enabled = True
+        self.path = path
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
+            open(path, "w").close()
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time the enclosed block. Yields the span's attribute dict, which the block can add to
+        (e.g. token counts once a response has arrived).
+        """
+        if not self.enabled:
+            yield {}
+            return
+        parent = _current_span.get()
+        if parent is not None:
+            attrs = {**{key: parent["attrs"][key] for key in self.inherited if key in parent["attrs"]}, **attrs}
+        with self.lock:
+            span_id = self.next_id
+            self.next_id += 1
+        record = {"id": span_id, "parent": None if parent is None else parent["id"], "name": name,
+                  "thread": threading.get_ident(), "start": time.perf_counter() - self.origin, "attrs": attrs}
+        token = _current_span.set(record)
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            record["duration"] = time.perf_counter() - self.origin - record["start"]
+            _current_span.reset(token)
+            self.finish(record)
+
+    def finish(self, record):
+        with self.lock:
+            self.spans.append(record)
+            if self.path is not None:
+                with open(self.path, "a") as file:
+                    file.write(json.dumps(record, default=str) + "\n")
+
+    def save_chrome_trace(self, path):
+        with self.lock:
+            events = [{"name": record["name"], "ph": "X", "pid": os.getpid(), "tid": record["thread"],
+                       "ts": record["start"] * 1e6, "dur": record["duration"] * 1e6,
+                       "args": {**record["attrs"], "id": record["id"], "parent": record["parent"]}}
+                      for record in self.spans]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+    def summary(self, top=10):
+        """
+        Text report of where time went: the top span kinds by total time (split by action), time per tree
+        depth, and totals for LLM calls, tokens, cache hits, retries and code execution.
+        """
+        with self.lock:
+            spans = list(self.spans)
+        by_kind = defaultdict(lambda: [0, 0.0])
+        by_level = defaultdict(lambda: [0, 0.0])
+        totals = defaultdict(float)
+        for record in spans:
+            attrs = record["attrs"]
+            kind = record["name"] + (f" [{attrs['action']}]" if attrs.get("action") else "")
+            by_kind[kind][0] += 1
+            by_kind[kind][1] += record["duration"]
+            if record["name"] == "node":
+                by_level[attrs.get("level")][0] += 1
+                by_level[attrs.get("level")][1] += record["duration"]
+            if record["name"] == "llm":
+                totals["llm calls"] += 1
+                totals["llm time (s)"] += record["duration"]
+                totals["prompt tokens"] += attrs.get("prompt_tokens") or 0
+                totals["completion tokens"] += attrs.get("completion_tokens") or 0
+                totals["cache hits"] += bool(attrs.get("cache_hit"))
+            if record["name"] == "exec":
+                totals["code executions"] += 1
+                totals["execution time (s)"] += record["duration"]
+            totals["retries"] += attrs.get("retry", 0) > 0
+
+        lines = ["Top time consumers:"]
+        for kind, (count, total) in sorted(by_kind.items(), key=lambda item: -item[1][1])[:top]:
+            lines.append(f"  {kind:<45} {total:10.2f}s  {count:6d} spans  {total / count:8.2f}s avg")
+        lines.append("Node time by tree depth:")
+        for level, (count, total) in sorted(by_level.items(), key=lambda item: (item[0] is None, item[0])):
+            lines.append(f"  level {level}: {total:10.2f}s over {count} nodes")
+        lines.append("Totals:")
+        for key, value in totals.items():
+            lines.append(f"  {key}: {value:.2f}" if isinstance(value, float) and not value.is_integer() else f"  {key}: {int(value)}")
+        return "\n".join(lines)
+
+# process-wide tracer used by Task and LLM
+tracer = Tracer()